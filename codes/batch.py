@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+平行批次引擎 (Parallel Batch Engine)
+
+把 calculate_ev_metrics 拆成彼此獨立的求解工作 (RP、每個情境的 WS、EEV)，
+並將所有測試案例的工作一起丟進 process pool：
+  1. 所有案例的 RP 與 WS 同時送出
+  2. 某案例的 WS 全部完成後，立即送出該案例的 EEV
+內容相同的工作只送出一次；若提供 SolveCache，快取中已有的結果直接取用
+每個 worker 的 Gurobi 執行緒數由 threads_per_worker 限制，避免超額使用 CPU
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from distflow import ieee13_network
+import instrumentation
+import planning
+from planning import (DEFAULT_PARAMS, solve_robust_model, solve_wait_and_see, evaluate_fixed_plan,
+                      calculate_ev_metrics, configure_worker, single_scenario, naive_plan, ev_summary)
+from solve_cache import solve_key, relabel_result
+
+
+def default_workers(threads_per_worker=1):
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+
+class _Jobs:
+    """ 以快取鍵去除重複的求解工作；快取中已有的結果不再送出 """
+
+    def __init__(self, pool, cache):
+        self.pool = pool
+        self.cache = cache
+        self.futures = {}
+        self.results = {}
+
+    def submit(self, key, fn, *args):
+        if key in self.futures or key in self.results:
+            return key
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            self.results[key] = cached
+        else:
+            self.futures[key] = self.pool.submit(fn, *args)
+        return key
+
+    def result(self, key):
+        if key not in self.results:
+            self.results[key] = self.futures.pop(key).result()
+            if self.cache is not None:
+                self.cache.put(key, self.results[key])
+        return self.results[key]
+
+
+def run_ev_batch(cases, net=None, params=DEFAULT_PARAMS, max_workers=None, threads_per_worker=1, cache=None):
+    """
+    cases: [(case_name, scenarios), ...]，與 test_cases 格式相同
+    回傳與 cases 順序相同的 calculate_ev_metrics 結果 (求解失敗者為 None)
+    max_workers=1 時直接在目前的 process 依序計算；cache 為 SolveCache (可省略)
+    """
+    if net is None: net = ieee13_network()
+    if max_workers is None: max_workers = default_workers(threads_per_worker)
+
+    if max_workers == 1:
+        return [calculate_ev_metrics(name, scens, net, params, cache=cache) for name, scens in cases]
+
+    # Gurobi 環境不可跨 fork 共用，因此一律使用 spawn
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                             initializer=configure_worker,
+                             initargs=(threads_per_worker, planning.SOLVER_BACKEND,
+                                       instrumentation.worker_state())) as pool:
+        jobs = _Jobs(pool, cache)
+
+        # 1. RP 與 WS 子問題
+        rp_keys = [jobs.submit(solve_key("RP", scens, net, params), solve_robust_model, name, scens, net, params)
+                   for name, scens in cases]
+        ws_inputs = [{s_key: single_scenario(scens, s_key) for s_key in scens} for _, scens in cases]
+        ws_keys = [
+            {s_key: jobs.submit(solve_key("RP", single, net, params), solve_wait_and_see, f"{s_key}_Only", single, net, params)
+             for s_key, single in inputs.items()}
+            for inputs in ws_inputs
+        ]
+
+        # 2. WS 完成後送出 EEV
+        ws_results = []
+        eev_keys = []
+        for (_, scens), inputs, keys in zip(cases, ws_inputs, ws_keys):
+            ws = {}
+            for s_key, key in keys.items():
+                res = jobs.result(key)
+                ws[s_key] = relabel_result(res, f"{s_key}_Only", inputs[s_key]) if res else None
+            ws_results.append(ws)
+            if any(res is None for res in ws.values()):
+                eev_keys.append(None)
+                continue
+            plan = naive_plan(scens, ws)
+            key = solve_key("EEV", scens, net, params, (tuple(sorted(plan[0])), tuple(sorted(plan[1]))))
+            eev_keys.append(jobs.submit(key, evaluate_fixed_plan, plan[0], plan[1], scens, net, params))
+
+        # 3. 組合結果
+        results = []
+        for (name, scens), rp_key, ws, eev_key in zip(cases, rp_keys, ws_results, eev_keys):
+            rp_result = jobs.result(rp_key)
+            if not rp_result or eev_key is None:
+                results.append(None)
+                continue
+            rp_result = relabel_result(rp_result, name, scens)
+            results.append(ev_summary(rp_result, scens, ws, jobs.result(eev_key)))
+    return results
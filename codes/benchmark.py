@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+效能基準測試 (Benchmark Suite)
+
+以隨機產生的饋線 (放射狀或含聯絡線的網狀，13 ~ 10,000 個節點) 與隨機攻擊情境 (2 ~ 1,000 個)
+量測 solve_robust_model (RP)、evaluate_fixed_plan (EEV) 與 calculate_ev_metrics (EV) 的規模效應。
+每個組態記錄: 建模時間、求解時間、B&B 節點數、MIP gap、峰值記憶體，輸出成 JSON 報表
+
+每個組態在獨立的 process 中執行 (每個 process 只跑一個組態)，
+因此峰值記憶體 (ru_maxrss) 是該組態自己的數值，授權限制或求解失敗也不會影響其他組態
+
+用法: python benchmark.py [--quick] [--out benchmark_report.json] [--time-limit 60]
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, replace
+
+import gurobipy as gp
+import numpy as np
+
+from distflow import Network
+from instrumentation import peak_rss_mb
+from milp_backend import BACKENDS
+from radiality import RADIALITY_METHODS, optimize
+from planning import (DEFAULT_PARAMS, build_robust_model, calculate_ev_metrics, RecourseEvaluator,
+                      configure_worker)
+
+# ==========================================
+# 1. 合成饋線與情境
+# ==========================================
+def synthetic_feeder(n_buses, n_ties=0, seed=0, S_base=1000.0, V_base=4.16):
+    """
+    隨機放射狀饋線: 節點 k 接到前面任一節點 (偏向最近加入的節點，使饋線有一定深度)
+    n_ties > 0 時另加 n_ties 條聯絡線 (網狀)，開關決策需靠輻射狀限制維持樹狀
+    """
+    rng = np.random.default_rng(seed)
+    node_ids = list(range(1, n_buses + 1))
+    lines_info = {}
+    for k in range(2, n_buses + 1):
+        parent = max(1, k - int(rng.geometric(0.3)))
+        lines_info[len(lines_info) + 1] = (parent, k)
+
+    existing = {frozenset(e) for e in lines_info.values()}
+    while n_ties > 0 and n_buses > 3:
+        u, v = (int(x) for x in rng.choice(node_ids, size=2, replace=False))
+        if frozenset((u, v)) in existing:
+            continue
+        existing.add(frozenset((u, v)))
+        lines_info[len(lines_info) + 1] = (min(u, v), max(u, v))
+        n_ties -= 1
+
+    P = {i: (0.0 if i == 1 else float(rng.uniform(0, 200))) for i in node_ids}
+    Q = {i: 0.5 * p for i, p in P.items()}
+    R = {l: float(rng.uniform(0.05, 0.15)) for l in lines_info}
+    X = {l: float(rng.uniform(0.05, 0.15)) for l in lines_info}
+    return Network(node_ids, lines_info, P, Q, R_ohm=R, X_ohm=X, root=1, S_base=S_base, V_base=V_base)
+
+def random_scenarios(net, n_scenarios, max_attack=3, seed=0):
+    """ n_scenarios 個攻擊情境 S1, S2, ...；每個情境攻擊 1 ~ max_attack 條線，機率取自 Dirichlet 分布 """
+    rng = np.random.default_rng(seed)
+    probs = rng.dirichlet(np.ones(n_scenarios))
+    scenarios = {}
+    for s in range(n_scenarios):
+        k = int(rng.integers(1, min(max_attack, net.n_lines) + 1))
+        attack = sorted(int(l) for l in rng.choice(net.line_ids, size=k, replace=False))
+        scenarios[f"S{s + 1}"] = {'attack': attack, 'prob': float(probs[s])}
+    return scenarios
+
+# ==========================================
+# 2. 單一組態的量測
+# ==========================================
+@dataclass(frozen=True)
+class BenchConfig:
+    n_buses: int
+    n_scenarios: int
+    n_ties: int = 0
+    seed: int = 0
+    ev_metrics: bool = False  # 是否另外量測 calculate_ev_metrics (WS 次數隨情境數線性增加)
+
+    @property
+    def name(self):
+        kind = f"mesh{self.n_ties}" if self.n_ties else "radial"
+        return f"{kind}_{self.n_buses}b_{self.n_scenarios}s"
+
+
+def _model_stats(model):
+    """ 求解後的統計值；未求解或無可行解時對應欄位為 None """
+    stats = {"status": model.status, "n_vars": model.NumVars, "n_constrs": model.NumConstrs,
+             "n_binaries": model.NumBinVars, "solve_s": model.Runtime,
+             "node_count": None, "mip_gap": None, "obj": None}
+    if model.IsMIP:
+        stats["node_count"] = model.NodeCount
+    if model.SolCount > 0:
+        stats["obj"] = model.ObjVal
+        if model.IsMIP:
+            stats["mip_gap"] = model.MIPGap
+    return stats
+
+def _error_text(e):
+    return f"{type(e).__name__}: {e}"
+
+def run_config(config, time_limit=None, params=DEFAULT_PARAMS):
+    """ 在目前的 process 中量測一個組態，回傳紀錄 (list of dict) """
+    record = {"config": config.name, **asdict(config)}
+    rows = []
+
+    t0 = time.perf_counter()
+    net = synthetic_feeder(config.n_buses, config.n_ties, config.seed)
+    scenarios = random_scenarios(net, config.n_scenarios, seed=config.seed)
+    record["n_lines"] = net.n_lines
+    record["gen_s"] = time.perf_counter() - t0
+
+    def measure(kind, build, solve, screened=None):
+        """
+        build() -> (model, handle)；solve(handle) 執行求解
+        screened(handle): 由圖論篩選直接求得的情境數 (EEV)；全部情境都被篩選時 MILP 沒有求解，
+        status 記為 "SCREENED"，obj 為 solve 的回傳值
+        """
+        row = dict(record, kind=kind)
+        try:
+            t0 = time.perf_counter()
+            model, handle = build()
+            row["build_s"] = time.perf_counter() - t0
+            if time_limit is not None:
+                model.setParam('TimeLimit', time_limit)
+            t0 = time.perf_counter()
+            result = solve(handle)
+            row["wall_s"] = time.perf_counter() - t0
+            row.update(_model_stats(model))
+            if screened is not None:
+                row["screened"] = screened(handle)
+                if row["screened"] == len(scenarios):
+                    row.update(status="SCREENED", solve_s=0.0, node_count=None, mip_gap=None, obj=result)
+        except Exception as e:
+            # 例如受限授權的模型大小上限，或 HiGHS / CBC 後端的失敗 (scipy、子程序、記憶體不足)；
+            # 不論後端，記錄錯誤 (含例外類別) 後繼續其他量測
+            row["error"] = _error_text(e)
+            handle = None
+        row["peak_rss_mb"] = peak_rss_mb()
+        rows.append(row)
+        return handle
+
+    # RP: Extensive Form
+    def build_rp():
+        model, y_h, y_g = build_robust_model(config.name, scenarios, net, params)
+        return model, (model, y_h, y_g)
+    rp = measure("RP", build_rp, lambda h: optimize(h[0]))
+
+    # EEV: 以 RP 方案 (RP 失敗時為不投資) 評估固定方案
+    plan = ([], [])
+    if rp is not None and rp[0].SolCount > 0:
+        model, y_h, y_g = rp
+        plan = ([net.line_ids[k] for k in np.flatnonzero(y_h.X > 0.5)],
+                [net.candidate_nodes[k] for k in np.flatnonzero(y_g.X > 0.5)])
+        model.dispose()
+
+    def build_eev():
+        ev = RecourseEvaluator(net, params, len(scenarios))
+        return ev.model, ev
+    measure("EEV", build_eev, lambda ev: ev.evaluate(plan[0], plan[1], scenarios), lambda ev: ev.n_screened)
+
+    # EV: 整個 calculate_ev_metrics 的總時間 (RP + 各情境 WS + EEV)
+    if config.ev_metrics:
+        row = dict(record, kind="EV")
+        try:
+            t0 = time.perf_counter()
+            res = calculate_ev_metrics(config.name, scenarios, net, params)
+            row["wall_s"] = time.perf_counter() - t0
+            row["obj"] = res["Obj Value"] if res else None
+        except Exception as e:
+            row["error"] = _error_text(e)
+        row["peak_rss_mb"] = peak_rss_mb()
+        rows.append(row)
+    return rows
+
+def _run_isolated(args):
+    config, time_limit, threads, backend, params = args
+    configure_worker(threads, backend)
+    return run_config(config, time_limit, params)
+
+# ==========================================
+# 3. 整體流程
+# ==========================================
+FULL_GRID = [BenchConfig(b, s, t, ev_metrics=(s <= 10))
+             for b in (13, 100, 1000, 10000) for s in (2, 10, 100, 1000) for t in (0, max(1, b // 20))]
+QUICK_GRID = [BenchConfig(b, s, t, ev_metrics=True) for b in (13, 30) for s in (2, 5) for t in (0, 2)]
+
+def run_benchmark(configs, out_path="benchmark_report.json", time_limit=None, max_workers=1, threads=None,
+                  backend="gurobi", params=DEFAULT_PARAMS):
+    """
+    每個組態在獨立的 spawn process 中執行；max_workers > 1 時同時跑數個組態 (時間量測會互相干擾)
+    報表為 JSON: {"meta": {...}, "results": [...]}，results 每列為一次量測 (kind = RP / EEV / EV)
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+        for config, rows in zip(configs, pool.map(_run_isolated, [(c, time_limit, threads, backend, params) for c in configs])):
+            results.extend(rows)
+            for r in rows:
+                status = r.get("error") or f"status={r.get('status', '-')}"
+                print(f"{config.name:<24} {r['kind']:<4} build={r.get('build_s', 0):8.3f}s "
+                      f"wall={r.get('wall_s', 0):8.3f}s  {status}")
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "gurobi": ".".join(map(str, gp.gurobi.version())),
+            "backend": backend, "time_limit": time_limit, "threads": threads, "params": asdict(params),
+        },
+        "results": results,
+    }
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=1, default=float)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the planning models on synthetic feeders")
+    parser.add_argument("--quick", action="store_true", help="small grid for regression checks")
+    parser.add_argument("--out", default="benchmark_report.json")
+    parser.add_argument("--time-limit", type=float, default=None, help="per-model solver time limit (s)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="solver threads per model")
+    parser.add_argument("--backend", default="gurobi", choices=BACKENDS)
+    parser.add_argument("--radiality", default=DEFAULT_PARAMS.Radiality, choices=RADIALITY_METHODS)
+    args = parser.parse_args()
+
+    grid = QUICK_GRID if args.quick else FULL_GRID
+    run_benchmark(grid, args.out, args.time_limit, args.workers, args.threads, args.backend,
+                  replace(DEFAULT_PARAMS, Radiality=args.radiality))
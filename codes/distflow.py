@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+共用 LinDistFlow 模型建構模組 (Shared Network Model Builder)
+
+Phase 1 ~ Phase 3 的腳本都從這裡取得:
+  * Network: 網路資料 (節點、線路、負載、阻抗) 與其陣列索引
+  * ieee13_network(): 專案使用的修正版 IEEE 13-node 系統
+  * add_distflow_block(): 針對單一情境建立一組 LinDistFlow 變數與限制式 (矩陣形式)
+"""
+import hashlib
+
+from gurobipy import GRB
+import numpy as np
+import scipy.sparse as sp
+
+from radiality import add_radiality
+
+# ==========================================
+# 1. 網路資料 (Network)
+# ==========================================
+class Network:
+    """ 網路拓撲與電氣參數；所有數值同時保留 dict (以 ID 查詢) 與 ndarray (以位置查詢) 兩種形式 """
+
+    def __init__(self, node_ids, lines_info, P_load_kW, Q_load_kW=None,
+                 R_ohm=0.1, X_ohm=0.1, root=1, S_base=1000.0, V_base=4.16, pos=None, rating_kVA=None):
+        self.S_base = S_base  # kVA
+        self.V_base = V_base  # kV
+        self.Z_base = (V_base ** 2) * 1000 / S_base
+
+        self.node_ids = list(node_ids)
+        self.lines_info = dict(lines_info)
+        self.line_ids = list(self.lines_info.keys())
+        self.root = root
+        self.pos = pos
+
+        # ID -> 陣列位置
+        self.node_pos = {n: k for k, n in enumerate(self.node_ids)}
+        self.line_pos = {l: k for k, l in enumerate(self.line_ids)}
+        self.root_pos = self.node_pos[root]
+        self.from_pos = np.array([self.node_pos[u] for u, _ in self.lines_info.values()], dtype=int)
+        self.to_pos = np.array([self.node_pos[v] for _, v in self.lines_info.values()], dtype=int)
+        self._build_incidence()
+
+        # 負載 (kW -> p.u.)，Q 未提供時假設為 0
+        if Q_load_kW is None:
+            Q_load_kW = {i: 0 for i in self.node_ids}
+        self.P_load_kW = dict(P_load_kW)
+        self.Q_load_kW = dict(Q_load_kW)
+        self.P_load_pu = np.array([self.P_load_kW[i] for i in self.node_ids], dtype=float) / S_base
+        self.Q_load_pu = np.array([self.Q_load_kW[i] for i in self.node_ids], dtype=float) / S_base
+
+        # 阻抗 (Ohms -> p.u.)，可給單一數值 (全部線路相同) 或 {line_id: Ohms}
+        self.R_pu = self._per_line(R_ohm) / self.Z_base
+        self.X_pu = self._per_line(X_ohm) / self.Z_base
+
+        # 線路額定容量 (kVA -> p.u.)，未提供者為 inf
+        self.rating_kVA = self._per_line(np.inf if rating_kVA is None else rating_kVA)
+        self.S_max_pu = self.rating_kVA / S_base
+
+    def _build_incidence(self):
+        """
+        節點-線路關聯矩陣 A (N x L)：線路流入節點為 +1、流出節點為 -1
+        實功平衡 sum(P_in) - sum(P_out) 即為 A @ P_flow，不必再對每個節點掃描所有線路
+        """
+        N, L = len(self.node_ids), len(self.line_ids)
+        rows = np.concatenate([self.to_pos, self.from_pos])
+        cols = np.concatenate([np.arange(L), np.arange(L)])
+        vals = np.concatenate([np.ones(L), -np.ones(L)])
+        self.incidence = sp.csr_matrix((vals, (rows, cols)), shape=(N, L))
+        self.non_root_pos = np.array([k for k in range(N) if k != self.root_pos], dtype=int)
+
+        # 各節點的流入/流出線路 (線路位置)
+        self.in_lines = [[] for _ in range(N)]
+        self.out_lines = [[] for _ in range(N)]
+        for k in range(L):
+            self.in_lines[self.to_pos[k]].append(k)
+            self.out_lines[self.from_pos[k]].append(k)
+
+    def _per_line(self, value):
+        if isinstance(value, dict):
+            return np.array([value[l] for l in self.line_ids], dtype=float)
+        return np.full(len(self.line_ids), float(value))
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_lines(self):
+        return len(self.line_ids)
+
+    @property
+    def candidate_nodes(self):
+        """ 可安裝 B-DG 的節點 (除了 Slack Bus 以外的所有節點) """
+        return [i for i in self.node_ids if i != self.root]
+
+    def fingerprint(self):
+        """ 網路內容的雜湊值 (拓撲、負載、阻抗、基準值)，作為求解快取的鍵 """
+        if getattr(self, "_fingerprint", None) is None:
+            h = hashlib.sha256()
+            h.update(repr((self.node_ids, list(self.lines_info.items()), self.root, self.S_base, self.V_base)).encode())
+            for arr in (self.P_load_pu, self.Q_load_pu, self.R_pu, self.X_pu, self.S_max_pu):
+                h.update(np.ascontiguousarray(arr, dtype=float).tobytes())
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def bridge_structure(self):
+        """
+        以根節點為起點的 DFS (Tarjan) 找出橋 (拆掉後網路分成兩側的線路)
+        回傳 (bridge_child, order, parent_pos):
+          bridge_child[k]: 線路 k 若為橋，為不含根節點那一側在 DFS 樹中的頂點 (節點位置)；否則為 -1
+          order / parent_pos: DFS 前序與 DFS 樹的父節點，供 subtree_sum 使用
+        """
+        if getattr(self, "_bridges", None) is None:
+            N = self.n_nodes
+            adj = [[] for _ in range(N)]
+            for k, (a, b) in enumerate(zip(self.from_pos, self.to_pos)):
+                adj[a].append((b, k)); adj[b].append((a, k))
+            tin = np.full(N, -1); low = np.zeros(N, dtype=int)
+            parent_pos = np.full(N, -1); parent_line = np.full(N, -1)
+            bridge_child = np.full(self.n_lines, -1)
+            order = []
+            tin[self.root_pos] = low[self.root_pos] = 0
+            order.append(self.root_pos)
+            stack = [(self.root_pos, iter(adj[self.root_pos]))]
+            while stack:
+                u, it = stack[-1]
+                for w, k in it:
+                    if k == parent_line[u]:
+                        continue
+                    if tin[w] < 0:
+                        tin[w] = low[w] = len(order)
+                        order.append(w)
+                        parent_pos[w] = u; parent_line[w] = k
+                        stack.append((w, iter(adj[w])))
+                        break
+                    low[u] = min(low[u], tin[w])
+                else:
+                    stack.pop()
+                    p = parent_pos[u]
+                    if p >= 0:
+                        low[p] = min(low[p], low[u])
+                        if low[u] > tin[p]:
+                            bridge_child[parent_line[u]] = u
+            self._bridges = (bridge_child, np.array(order, dtype=int), parent_pos)
+        return self._bridges
+
+    def subtree_sum(self, values):
+        """ DFS 樹中每個節點 (含) 以下所有節點的 values 總和 """
+        _, order, parent_pos = self.bridge_structure()
+        acc = np.array(values, dtype=float)
+        for u in order[::-1]:
+            if parent_pos[u] >= 0:
+                acc[parent_pos[u]] += acc[u]
+        return acc
+
+    def line_positions(self, lines):
+        return np.array([self.line_pos[l] for l in lines], dtype=int)
+
+    def node_positions(self, nodes):
+        return np.array([self.node_pos[i] for i in nodes], dtype=int)
+
+
+def ieee13_network():
+    """ 修正版 IEEE 13-node 系統 (zhang2020multi.pdf Fig. 6)，R = X = 0.1 Ohm """
+    node_ids = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
+    P_load_kW = {
+        1: 0, 2: 66.67, 3: 85, 4: 100, 5: 56.67,
+        6: 76.67, 7: 56.67, 8: 100, 9: 142.67, 10: 0,
+        11: 133.33, 12: 281, 13: 56.67
+    }
+    lines_info = {
+        1: (1, 2),   2: (2, 3),   3: (3, 4),   4: (2, 5),   5: (5, 6),
+        6: (6, 7),   7: (7, 8),   8: (3, 8),   9: (8, 9),   10: (4, 9),
+        11: (2, 10), 12: (10, 11), 13: (11, 12), 14: (12, 13), 15: (3, 13)
+    }
+    pos = {
+        1: (0, 1),  2: (1, 1),  3: (3, 1),  4: (4, 1),
+        5: (1, 0),  6: (2, 0),  7: (3, 0),  8: (3, 0.5), 9: (4, 0),
+        10: (1, 2), 11: (2, 2), 12: (3, 2), 13: (3, 1.5)
+    }
+    return Network(node_ids, lines_info, P_load_kW, R_ohm=0.1, X_ohm=0.1, pos=pos)
+
+
+# ==========================================
+# 2. 單一情境的 LinDistFlow 區塊 (Scenario Block)
+# ==========================================
+class DistFlowBlock:
+    """ 單一情境的第二階段變數 (皆為 MVar，依 Network 的節點/線路順序排列) """
+
+    def __init__(self, net, v, P_flow, Q_flow, U, delta_P, delta_Q, P_gen, gen_nodes, tree_vars=()):
+        self.net = net
+        self.v = v
+        self.P_flow = P_flow
+        self.Q_flow = Q_flow
+        self.U = U
+        self.delta_P = delta_P
+        self.delta_Q = delta_Q
+        self.P_gen = P_gen
+        self.gen_nodes = gen_nodes
+        self.tree_vars = list(tree_vars)  # 輻射狀限制額外使用的二元變數
+
+    def open_lines(self, lines):
+        """ 強制斷開指定線路 (v.ub = 0)，其餘線路恢復可用 """
+        ub = np.ones(self.net.n_lines)
+        if len(lines):
+            ub[self.net.line_positions(lines)] = 0.0
+        self.v.ub = ub
+
+    def relax(self):
+        """ 開關 (與輻射狀限制的二元變數) 改為連續變數，得到 LP 鬆弛 """
+        for var in [self.v] + self.tree_vars:
+            var.VType = GRB.CONTINUOUS
+
+    def shedding(self):
+        return self.delta_P.sum()
+
+    def switching(self):
+        return self.v.sum()
+
+
+# 電壓平方的上下界 (0.9 ~ 1.1 p.u.)
+V_MIN_SQ = 0.81
+V_MAX_SQ = 1.21
+
+
+def line_flow_bounds(net, gen_nodes=(), gen_cap_pu=0.0, max_gens=None):
+    """
+    由負載、DG 容量與額定容量推得各線路潮流的上下界 (p.u.)，回傳 (P_lb, P_ub, Q_lb, Q_ub)
+      * 橋: 設 B 為不含根節點的一側。流向 B 的潮流不超過 B 的總負載；
+            流出 B 的實功不超過 B 內 DG 的總出力 (最多 max_gens 台)，虛功則不會流出 B (DG 只供應實功)
+      * 非橋 (位於環路上): |潮流| 不超過全部負載
+    線路斷開時潮流為 0，因此這些界限同時也是容量限制 P <= P_ub * v 的 Big-M
+    """
+    bridge_child, _, _ = net.bridge_structure()
+    gen = np.zeros(net.n_nodes)
+    if len(gen_nodes):
+        gen[net.node_positions(gen_nodes)] = 1.0
+    P_sub, Q_sub, G_sub = net.subtree_sum(net.P_load_pu), net.subtree_sum(net.Q_load_pu), net.subtree_sum(gen)
+    P_tot, Q_tot = net.P_load_pu.sum(), net.Q_load_pu.sum()
+
+    P_in = np.full(net.n_lines, P_tot); P_out = np.full(net.n_lines, P_tot)
+    Q_in = np.full(net.n_lines, Q_tot); Q_out = np.full(net.n_lines, Q_tot)
+    is_bridge = bridge_child >= 0
+    c = bridge_child[is_bridge]
+    n_gen = G_sub[c] if max_gens is None else np.minimum(G_sub[c], max_gens)
+    P_in[is_bridge] = P_sub[c]
+    P_out[is_bridge] = np.maximum(0.0, np.minimum(n_gen * gen_cap_pu, P_tot - P_sub[c]))
+    Q_in[is_bridge] = Q_sub[c]
+    Q_out[is_bridge] = 0.0
+
+    # 線路方向 from -> to: 若 B 在 to 端，正向即流入 B
+    into_to = np.ones(net.n_lines, dtype=bool)
+    into_to[is_bridge] = net.to_pos[is_bridge] == c
+    P_ub = np.where(into_to, P_in, P_out); P_lb = -np.where(into_to, P_out, P_in)
+    Q_ub = np.where(into_to, Q_in, Q_out); Q_lb = -np.where(into_to, Q_out, Q_in)
+    cap = net.S_max_pu
+    return np.maximum(P_lb, -cap), np.minimum(P_ub, cap), np.maximum(Q_lb, -cap), np.minimum(Q_ub, cap)
+
+
+def add_distflow_block(model, net, tag="", gen_nodes=None, gen_cap_pu=0.0,
+                       big_M=None, flow_limit=None, V_min_sq=V_MIN_SQ, V_max_sq=V_MAX_SQ, radiality="flow", max_gens=None):
+    """
+    在 model 中加入一組 LinDistFlow 變數與限制式 (每個情境呼叫一次)
+    gen_nodes 為可能有 B-DG 的節點；其出力上限由呼叫端再以 y_g 或 ub 限制
+    radiality: 輻射狀限制的寫法 ("count" / "flow" / "parent" / "lazy"，見 radiality.py)
+    big_M / flow_limit: None 時依資料推得每條線路最緊的值 (line_flow_bounds 與電壓上下界)；
+                        給定數值則改用該常數 (原本的寫法為 10.0)
+    max_gens: 最多可建的 DG 數 (Budget_G)，用來收緊流出孤立側的潮流上界
+    """
+    N, L = net.n_nodes, net.n_lines
+    sfx = f"_{tag}" if tag != "" else ""
+    gen_nodes = list(gen_nodes) if gen_nodes is not None else []
+
+    # --- 變數 ---
+    # 潮流上下界 (同時作為容量限制的 Big-M)；有額定容量者不超過 S_max
+    if flow_limit is None:
+        P_lb, P_ub, Q_lb, Q_ub = line_flow_bounds(net, gen_nodes, gen_cap_pu, max_gens)
+    else:
+        cap = np.minimum(flow_limit, net.S_max_pu)
+        P_lb, P_ub, Q_lb, Q_ub = -cap, cap, -cap, cap
+    v = model.addMVar(L, vtype=GRB.BINARY, name=f"v{sfx}")
+    P_flow = model.addMVar(L, lb=P_lb, ub=P_ub, name=f"P_flow{sfx}")
+    Q_flow = model.addMVar(L, lb=Q_lb, ub=Q_ub, name=f"Q_flow{sfx}")
+
+    U_lb = np.full(N, V_min_sq); U_ub = np.full(N, V_max_sq)
+    U_lb[net.root_pos] = 1.0; U_ub[net.root_pos] = 1.0  # Slack Bus 固定
+    U = model.addMVar(N, lb=U_lb, ub=U_ub, name=f"U{sfx}")
+
+    delta_P = model.addMVar(N, lb=0.0, ub=net.P_load_pu, name=f"delta_P{sfx}")
+    delta_Q = model.addMVar(N, lb=0.0, ub=net.Q_load_pu, name=f"delta_Q{sfx}")
+    P_gen = model.addMVar(len(gen_nodes), lb=0.0, ub=gen_cap_pu, name=f"P_gen{sfx}")
+
+    # --- 1. 實功 / 虛功平衡 (Eq. 5b, 5c)，跳過 Slack Bus ---
+    # A @ P_flow + G @ P_gen == P_load - delta_P，G 為發電機 -> 節點的對應矩陣
+    nr = net.non_root_pos
+    A = net.incidence[nr]
+    gen_rows = net.node_positions(gen_nodes) if gen_nodes else np.zeros(0, dtype=int)
+    G = sp.csr_matrix((np.ones(len(gen_nodes)), (gen_rows, np.arange(len(gen_nodes)))),
+                      shape=(N, len(gen_nodes)))[nr]
+    model.addConstr(A @ P_flow + G @ P_gen == net.P_load_pu[nr] - delta_P[nr], name=f"P_Bal{sfx}")
+    model.addConstr(A @ Q_flow == net.Q_load_pu[nr] - delta_Q[nr], name=f"Q_Bal{sfx}")
+
+    # --- 2. 線路容量與開關邏輯 (Eq. 5d) ---
+    model.addConstr(P_flow <= P_ub * v, name=f"P_Cap_Ub{sfx}")
+    model.addConstr(P_flow >= P_lb * v, name=f"P_Cap_Lb{sfx}")
+    model.addConstr(Q_flow <= Q_ub * v, name=f"Q_Cap_Ub{sfx}")
+    model.addConstr(Q_flow >= Q_lb * v, name=f"Q_Cap_Lb{sfx}")
+
+    # --- 3. 電壓降 (Big-M) ---
+    # 線路斷開時潮流為 0，只需涵蓋兩端電壓平方的差: M_ub = U_ub[from] - U_lb[to]，M_lb = U_ub[to] - U_lb[from]
+    if big_M is None:
+        M_ub = U_ub[net.from_pos] - U_lb[net.to_pos]
+        M_lb = U_ub[net.to_pos] - U_lb[net.from_pos]
+    else:
+        M_ub = M_lb = np.full(L, big_M)
+    lhs = U[net.from_pos] - U[net.to_pos] - 2 * (net.R_pu * P_flow + net.X_pu * Q_flow)
+    model.addConstr(lhs <= M_ub * (1 - v), name=f"V_Drop_Ub{sfx}")
+    model.addConstr(lhs >= -M_lb * (1 - v), name=f"V_Drop_Lb{sfx}")
+
+    # --- 4. 防迴路限制 (Eq. 5i) ---
+    tree_vars = add_radiality(model, net, v, radiality, sfx)
+
+    return DistFlowBlock(net, v, P_flow, Q_flow, U, delta_P, delta_Q, P_gen, gen_nodes, tree_vars)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+第一階段方案列舉 (First-Stage Plan Enumeration)
+
+預算很小時 (例如 Budget_H = Budget_G = 1)，可行的 (y_h, y_g) 只有 (線路數+1) x (候選節點數+1) 種。
+與其每次重解整個聯合 MILP，不如:
+  1. 列舉所有可行方案
+  2. 以 LP 鬆弛 (開關 v 連續) 計算每個方案的期望成本下界
+  3. 依下界由小到大，用 RecourseEvaluator 精確評估；下界已不小於第 keep 名的精確成本者直接剪枝
+回傳完整的方案排名表；若不剪枝 (keep=None)，表中各情境的第二階段成本可直接算出 RP / WS / EEV
+"""
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from distflow import ieee13_network
+from planning import DEFAULT_PARAMS, RecourseEvaluator
+
+
+def enumerate_plans(net, params=DEFAULT_PARAMS):
+    """ 所有符合預算的 (強化線路, 發電機節點) 組合 """
+    for kh in range(params.Budget_H + 1):
+        for hardened in combinations(net.line_ids, kh):
+            for kg in range(params.Budget_G + 1):
+                for dgs in combinations(net.candidate_nodes, kg):
+                    yield list(hardened), list(dgs)
+
+
+def rank_plans(scenarios, net=None, params=DEFAULT_PARAMS, keep=1, tol=1e-6):
+    """
+    scenarios: 與 solve_robust_model 相同格式
+    keep: 保證精確評估的前幾名方案數；None 表示全部精確評估 (不剪枝)
+    回傳 DataFrame (依期望成本排序)，欄位:
+      Rank, Hardened, New DGs, Invest ($), Lower Bound, Expected Cost, Status, Q_<情境>
+    Status 為 "exact" 或 "pruned"；被剪枝的方案只有 Lower Bound
+    """
+    if net is None: net = ieee13_network()
+    keys = list(scenarios.keys())
+    probs = np.array([scenarios[s]['prob'] for s in keys], dtype=float)
+    # 各情境機率設為 1 時，各區塊獨立求解，last_costs 即為各情境的 LP 鬆弛成本 (LP 無 gap，總和最佳即各區塊最佳)
+    unit = {s: dict(sc, prob=1.0) for s, sc in scenarios.items()}
+
+    plans = list(enumerate_plans(net, params))
+    rows = []
+
+    # 1. LP 鬆弛下界
+    lp_eval = RecourseEvaluator(net, params, len(keys), relax=True)
+    for hardened, dgs in plans:
+        if lp_eval.evaluate(hardened, dgs, unit) >= 9999999.0:
+            raise RuntimeError(f"方案 {hardened} {dgs} 的 LP 鬆弛求解失敗")
+        q_lp = np.array([lp_eval.last_costs[s] for s in keys])
+        inv = params.invest_cost(len(hardened), len(dgs))
+        rows.append({
+            "Hardened": hardened, "New DGs": dgs, "Invest ($)": round(inv, 2),
+            "Lower Bound": inv + probs @ q_lp, "Expected Cost": np.nan, "Status": "pruned",
+            **{f"Q_{s}": np.nan for s in keys},
+        })
+
+    # 2. 依下界排序後精確評估，並以第 keep 名的成本剪枝
+    # MILP 逐情境求解: 合併求解時 MIPGap 只約束總和，個別 Q_<情境> (與重新加權後的 EEV) 會失準
+    mip_eval = RecourseEvaluator(net, params, 1)
+    exact_costs = []
+    for row in sorted(rows, key=lambda r: r["Lower Bound"]):
+        if keep is not None and len(exact_costs) >= keep:
+            threshold = sorted(exact_costs)[keep - 1]
+            if row["Lower Bound"] >= threshold - tol * max(1.0, abs(threshold)):
+                continue
+        q = mip_eval.scenario_costs(row["Hardened"], row["New DGs"], scenarios)
+        row["Expected Cost"] = row["Invest ($)"] + probs @ q
+        row["Status"] = "exact"
+        for s, q_s in zip(keys, q):
+            row[f"Q_{s}"] = q_s
+        exact_costs.append(row["Expected Cost"])
+
+    df = pd.DataFrame(rows)
+    df["_order"] = df["Expected Cost"].fillna(np.inf)
+    df = df.sort_values(["_order", "Lower Bound"], kind="stable").drop(columns="_order").reset_index(drop=True)
+    df.insert(0, "Rank", np.arange(1, len(df) + 1))
+    df["Lower Bound"] = df["Lower Bound"].round(2)
+    df["Expected Cost"] = df["Expected Cost"].round(2)
+    return df
+
+
+def ev_metrics_from_table(table, scenarios):
+    """
+    由完整 (keep=None) 的方案表直接計算 RP / WS / EEV / EVPI / VSS，不需再解任何 MILP
+    期望成本以表中的 Q_<情境> 依 scenarios 的機率重新加權，因此同一張表可用於任意機率
+    """
+    keys = list(scenarios.keys())
+    if (table["Status"] != "exact").any():
+        raise ValueError("方案表含有被剪枝的方案，請以 keep=None 建表")
+    q = table[[f"Q_{s}" for s in keys]].to_numpy()
+    inv = table["Invest ($)"].to_numpy()
+    probs = np.array([scenarios[s]['prob'] for s in keys], dtype=float)
+
+    expected = inv + q @ probs
+    rp_idx = int(np.argmin(expected))
+    ws_each = (inv[:, None] + q).min(axis=0)
+    naive_idx = int(np.argmin(inv + q[:, int(np.argmax(probs))]))
+
+    cost_rp = float(expected[rp_idx])
+    ws_total = float(probs @ ws_each)
+    cost_eev = float(expected[naive_idx])
+    return {
+        "Hardened": table["Hardened"].iloc[rp_idx], "New DGs": table["New DGs"].iloc[rp_idx],
+        "Obj Value": round(cost_rp, 2), "WS": round(ws_total, 2), "EEV": round(cost_eev, 2),
+        "EVPI": round(cost_rp - ws_total, 2), "VSS": round(cost_eev - cost_rp, 2),
+    }
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+求解記錄 (Solver Instrumentation)
+
+enable(path) 之後，每次求解 (RP / WS 的 solve_robust_model、EEV 的 evaluate_fixed_plan) 都會留下一筆紀錄:
+  建模時間、求解時間、模型與 presolve 後的大小、B&B 節點數、目標值 / 下界 / gap、
+  gap 隨時間的變化 (Gurobi callback，每次 incumbent 或 bound 改變時取樣) 與 process 的峰值記憶體
+紀錄即時附加到 JSON-lines 檔 (每筆一次 write，多個 worker 可寫同一個檔)，並保留在記憶體中；
+phase("...") 標記目前的分析階段，summary() 依 (phase, kind) 彙總
+
+未 enable 時 solve() 只呼叫 radiality.optimize，不掛 callback，沒有額外開銷。
+process pool 的 worker 以 planning.configure_worker(threads, backend, worker_state()) 沿用同一個紀錄檔與階段
+"""
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+import gurobipy as gp
+from gurobipy import GRB
+import pandas as pd
+
+from radiality import optimize
+
+_RECORDER = None
+_PHASE = ""
+_KIND = None
+
+def peak_rss_mb():
+    # Linux 的 ru_maxrss 單位為 KB，macOS 為 bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+# ==========================================
+# 1. 紀錄器
+# ==========================================
+class SolveRecorder:
+    """ 收集求解紀錄；path 不為 None 時每筆紀錄寫成一列 JSON (append=False 時先清空該檔案) """
+
+    def __init__(self, path=None, append=False):
+        self.path = path
+        self.records = []
+        self._fd = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (0 if append else os.O_TRUNC)
+            self._fd = os.open(path, flags, 0o644)
+
+    def add(self, record):
+        self.records.append(record)
+        if self._fd is not None:
+            os.write(self._fd, (json.dumps(record) + "\n").encode("utf-8"))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def enable(path=None, append=False):
+    """ 開始記錄 (取代既有的紀錄器)，回傳 SolveRecorder """
+    global _RECORDER
+    disable()
+    _RECORDER = SolveRecorder(path, append)
+    return _RECORDER
+
+def disable():
+    global _RECORDER
+    if _RECORDER is not None:
+        _RECORDER.close()
+    _RECORDER = None
+
+def recorder():
+    return _RECORDER
+
+def worker_state():
+    """ 傳給 process pool initializer 的狀態: (紀錄檔路徑, 目前階段)；未啟用時為 None """
+    if _RECORDER is None:
+        return None
+    return (_RECORDER.path, _PHASE)
+
+def configure_worker(state):
+    """ 在 worker 中還原 worker_state() """
+    global _PHASE
+    if state is None:
+        return
+    path, _PHASE = state
+    enable(path, append=True)
+
+@contextmanager
+def phase(name):
+    """ 標記分析階段 (例如 "Phase 5 Sensitivity")；可巢狀，離開時還原 """
+    global _PHASE
+    previous, _PHASE = _PHASE, name
+    try:
+        yield
+    finally:
+        _PHASE = previous
+
+@contextmanager
+def solve_kind(kind):
+    """ 覆寫內層求解的種類標籤 (例如 calculate_ev_metrics 中的 WS 求解) """
+    global _KIND
+    previous, _KIND = _KIND, kind
+    try:
+        yield
+    finally:
+        _KIND = previous
+
+# ==========================================
+# 2. 求解
+# ==========================================
+class _GurobiProbe:
+    """ callback: presolve 刪除的列 / 欄數與 (時間, incumbent, bound) 的變化 """
+
+    def __init__(self):
+        self.row_del = self.col_del = None
+        self.trace = []
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.PRESOLVE:
+            self.row_del = model.cbGet(GRB.Callback.PRE_ROWDEL)
+            self.col_del = model.cbGet(GRB.Callback.PRE_COLDEL)
+        elif where == GRB.Callback.MIP:
+            point = (model.cbGet(GRB.Callback.MIP_OBJBST), model.cbGet(GRB.Callback.MIP_OBJBND))
+            if not self.trace or self.trace[-1][1:] != point:
+                self.trace.append((model.cbGet(GRB.Callback.RUNTIME),) + point)
+
+
+def _gap(best, bound):
+    if best is None or bound is None or abs(best) >= GRB.INFINITY:
+        return None
+    return abs(best - bound) / max(abs(best), 1e-10)
+
+def solve(model, kind, build_s=0.0):
+    """
+    以 radiality.optimize 求解 model；啟用紀錄時另外記錄一筆
+    kind: "RP" / "WS" / "EEV" ...；solve_kind() 內以其標籤為準。build_s: 這次求解之前花在建模 / 更新模型的時間
+    """
+    rec = _RECORDER
+    if rec is None:
+        optimize(model)
+        return
+    probe = _GurobiProbe() if isinstance(model, gp.Model) else None
+    t0 = time.perf_counter()
+    optimize(model, probe)
+    wall = time.perf_counter() - t0
+
+    record = {
+        "ts": time.time(), "pid": os.getpid(), "phase": _PHASE, "kind": _KIND or kind,
+        "model": model.ModelName, "build_s": round(build_s, 6), "solve_s": round(wall, 6),
+        "solver_s": model.Runtime, "status": model.status,
+        "n_vars": model.NumVars, "n_constrs": model.NumConstrs, "n_binaries": model.NumBinVars,
+        "presolve_constrs": None, "presolve_vars": None,
+        "nodes": model.NodeCount if model.IsMIP else None,
+        "obj": None, "bound": None, "mip_gap": None, "gap_trace": [],
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if model.SolCount > 0:
+        record["obj"] = model.ObjVal
+        if model.IsMIP:
+            record["mip_gap"] = model.MIPGap
+    if probe is not None:
+        if probe.row_del is not None:
+            record["presolve_constrs"] = model.NumConstrs - int(probe.row_del)
+            record["presolve_vars"] = model.NumVars - int(probe.col_del)
+        if model.IsMIP:
+            record["bound"] = model.ObjBound
+        record["gap_trace"] = [(round(t, 4), best, bound, _gap(best, bound)) for t, best, bound in probe.trace]
+    rec.add(record)
+
+# ==========================================
+# 3. 彙總
+# ==========================================
+def load_records(path):
+    """ 讀回 JSON-lines 紀錄檔 (例如合併各 worker 的紀錄) """
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+def summary(records=None):
+    """
+    依 (phase, kind) 彙總: 次數、建模 / 求解時間 (總和、平均、最大)、節點數、最大峰值記憶體
+    records 省略時使用目前的紀錄器；有紀錄檔時從檔案讀回 (包含 worker 寫入的紀錄)
+    """
+    if records is None:
+        if _RECORDER is None:
+            records = []
+        elif _RECORDER.path:
+            records = load_records(_RECORDER.path)
+        else:
+            records = _RECORDER.records
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+    return df.groupby(["phase", "kind"], sort=False).agg(
+        solves=("solve_s", "size"),
+        build_s=("build_s", "sum"),
+        solve_s=("solve_s", "sum"),
+        mean_solve_s=("solve_s", "mean"),
+        max_solve_s=("solve_s", "max"),
+        nodes=("nodes", "sum"),
+        peak_rss_mb=("peak_rss_mb", "max"),
+    ).round(4).reset_index()
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+開源 MILP 求解器後端 (Open-Source MILP Backends)
+
+MatrixModel 提供 add_distflow_block / build_robust_model / RecourseEvaluator 所用到的
+gurobipy 介面子集 (addMVar、addConstr、setObjective、MVar 的 .X / .ub / .Obj / .VType ...)，
+但內部只累積成矩陣形式:
+    min  c @ x + c0   s.t.  lo <= A @ x <= hi,  lb <= x <= ub,  x_j 為整數 (j in I)
+最後交給開源求解器，不需要 Gurobi 授權:
+  * "highs": scipy.optimize.milp (HiGHS)
+  * "cbc"  : 寫成 MPS 後呼叫 cbc 執行檔 (需在 PATH 中)
+求解狀態沿用 GRB 的代碼 (GRB.OPTIMAL ...)，因此既有的結果讀取程式不需修改
+不支援限制式的 RHS / 對偶值 (decomposition 仍需使用 gurobi 後端)
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from gurobipy import GRB
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+BACKENDS = ("gurobi", "highs", "cbc")
+
+# ==========================================
+# 1. 線性運算式 (矩陣形式)
+# ==========================================
+def _pad(M, n_cols):
+    M = M.tocsr()
+    if M.shape[1] == n_cols:
+        return M
+    return sp.csr_matrix((M.data, M.indices, M.indptr), shape=(M.shape[0], n_cols))
+
+
+class LinExpr:
+    """ 向量線性運算式 coeffs @ x + const (coeffs 為 m x n 稀疏矩陣) """
+    __array_ufunc__ = None  # 讓 ndarray 與 scipy.sparse 的運算交給本類別處理
+
+    def __init__(self, coeffs, const):
+        self.coeffs = coeffs.tocsr()
+        self.const = np.asarray(const, dtype=float).reshape(-1)
+
+    def __array__(self, dtype=None, copy=None):
+        # 0 維 object 陣列: scipy.sparse 的 A @ expr 會因此回傳 NotImplemented，改呼叫 __rmatmul__
+        box = np.empty((), dtype=object)
+        box[()] = self
+        return box
+
+    @property
+    def shape(self):
+        return (self.coeffs.shape[0],)
+
+    def __len__(self):
+        return self.coeffs.shape[0]
+
+    def _coerce(self, other):
+        if isinstance(other, LinExpr):
+            return other
+        const = np.broadcast_to(np.asarray(other, dtype=float), (len(self),))
+        return LinExpr(sp.csr_matrix((len(self), self.coeffs.shape[1])), const)
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        n = max(self.coeffs.shape[1], other.coeffs.shape[1])
+        return LinExpr(_pad(self.coeffs, n) + _pad(other.coeffs, n), self.const + other.const)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return LinExpr(-self.coeffs, -self.const)
+
+    def __sub__(self, other):
+        return self + (-self._coerce(other))
+
+    def __rsub__(self, other):
+        return (-self) + other
+
+    def __mul__(self, other):
+        w = np.asarray(other, dtype=float)
+        if w.ndim == 0:
+            return LinExpr(self.coeffs * float(w), self.const * float(w))
+        return LinExpr(sp.diags(w) @ self.coeffs, w * self.const)
+
+    __rmul__ = __mul__
+
+    def __rmatmul__(self, other):
+        other = sp.csr_matrix(other) if not sp.issparse(other) else other
+        return LinExpr(other @ self.coeffs, other @ self.const)
+
+    def __getitem__(self, idx):
+        rows = np.arange(len(self))[idx]
+        return LinExpr(self.coeffs[np.atleast_1d(rows)], self.const[rows])
+
+    def sum(self):
+        return LinExpr(sp.csr_matrix(self.coeffs.sum(axis=0)), [self.const.sum()])
+
+    # 比較運算產生限制式 (lhs - rhs 與 0 比較)
+    def __le__(self, other):
+        return _TempConstr(self - other, "<")
+
+    def __ge__(self, other):
+        return _TempConstr(self - other, ">")
+
+    def __eq__(self, other):
+        return _TempConstr(self - other, "=")
+
+    __hash__ = None
+
+
+class _TempConstr:
+    def __init__(self, expr, sense):
+        self.expr = expr
+        self.sense = sense
+
+
+class MatVar(LinExpr):
+    """ 一組連續編號的變數；屬性 (ub, lb, Obj, VType, Start, X) 直接讀寫 MatrixModel 的陣列 """
+
+    def __init__(self, model, cols):
+        n = len(cols)
+        super().__init__(sp.csr_matrix((np.ones(n), (np.arange(n), cols)), shape=(n, cols[-1] + 1 if n else 0)),
+                         np.zeros(n))
+        self._model = model
+        self._cols = cols
+
+    def _get(self, name):
+        return getattr(self._model, name)[self._cols]
+
+    def _set(self, name, value):
+        getattr(self._model, name)[self._cols] = value
+
+    lb = property(lambda self: self._get("_lb"), lambda self, v: self._set("_lb", v))
+    ub = property(lambda self: self._get("_ub"), lambda self, v: self._set("_ub", v))
+    Obj = property(lambda self: self._get("_obj"), lambda self, v: self._set("_obj", v))
+    Start = property(lambda self: self._get("_start"), lambda self, v: self._set("_start", v))
+    VType = property(lambda self: self._get("_vtype"), lambda self, v: self._set("_vtype", v))
+
+    @property
+    def X(self):
+        if self._model._x is None:
+            raise AttributeError("模型尚未求得可行解")
+        return self._model._x[self._cols]
+
+# ==========================================
+# 2. 矩陣模型
+# ==========================================
+class MatrixModel:
+    """ gurobipy.Model 的矩陣版替代品；solver 為 "highs" 或 "cbc" """
+
+    def __init__(self, name="", solver="highs"):
+        if solver not in ("highs", "cbc"):
+            raise ValueError(f"未知的求解器後端: {solver}")
+        self.ModelName = name
+        self.solver = solver
+        self.params = {"OutputFlag": 1, "TimeLimit": None, "MIPGap": None, "Threads": None}
+        self._lb = np.zeros(0); self._ub = np.zeros(0); self._obj = np.zeros(0)
+        self._start = np.zeros(0); self._vtype = np.zeros(0, dtype="<U1")
+        self._rows = []  # [(coeffs, lo, hi, name)]
+        self.ObjCon = 0.0
+        self.ModelSense = GRB.MINIMIZE
+        self._reset_solution()
+
+    def _reset_solution(self):
+        self._x = None
+        self.status = GRB.LOADED
+        self.objVal = self.ObjVal = None
+        self.MIPGap = self.NodeCount = None
+        self.Runtime = 0.0
+        self.SolCount = 0
+
+    # --- gurobipy 相容介面 ---
+    def setParam(self, name, value):
+        self.params[name] = value
+
+    def addMVar(self, shape, lb=0.0, ub=float("inf"), obj=0.0, vtype=GRB.CONTINUOUS, name=""):
+        n = int(np.prod(shape))
+        start = len(self._lb)
+        self._lb = np.concatenate([self._lb, np.broadcast_to(np.asarray(lb, dtype=float), (n,))])
+        self._ub = np.concatenate([self._ub, np.broadcast_to(np.asarray(ub, dtype=float), (n,))])
+        self._obj = np.concatenate([self._obj, np.broadcast_to(np.asarray(obj, dtype=float), (n,))])
+        self._start = np.concatenate([self._start, np.full(n, np.nan)])
+        self._vtype = np.concatenate([self._vtype, np.full(n, vtype)])
+        if vtype == GRB.BINARY:
+            self._lb[start:] = np.maximum(self._lb[start:], 0.0)
+            self._ub[start:] = np.minimum(self._ub[start:], 1.0)
+        return MatVar(self, np.arange(start, start + n))
+
+    def addConstr(self, constr, name=""):
+        expr = constr.expr
+        lo = np.full(len(expr), -np.inf); hi = np.full(len(expr), np.inf)
+        if constr.sense in "<=":
+            hi = -expr.const
+        if constr.sense in ">=":
+            lo = -expr.const
+        self._rows.append((expr.coeffs, lo, hi, name))
+        return len(self._rows) - 1
+
+    def setObjective(self, expr, sense=GRB.MINIMIZE):
+        expr = expr if isinstance(expr, LinExpr) else LinExpr(sp.csr_matrix((1, 0)), [float(expr)])
+        self._obj = np.asarray(_pad(expr.coeffs, len(self._lb)).toarray()).reshape(-1)
+        self.ObjCon = float(expr.const.sum())
+        self.ModelSense = sense
+
+    def update(self):
+        pass
+
+    def dispose(self):
+        self._rows = []
+
+    @property
+    def NumVars(self):
+        return len(self._lb)
+
+    @property
+    def NumConstrs(self):
+        return sum(c.shape[0] for c, *_ in self._rows)
+
+    @property
+    def NumBinVars(self):
+        return int((self._vtype == GRB.BINARY).sum())
+
+    @property
+    def IsMIP(self):
+        return int(np.isin(self._vtype, (GRB.BINARY, GRB.INTEGER)).any())
+
+    # --- 矩陣形式 ---
+    def to_matrices(self):
+        """ 回傳 (c, A, lo, hi, lb, ub, integrality)；c 已依 ModelSense 轉為最小化 """
+        n = self.NumVars
+        A = sp.vstack([_pad(c, n) for c, *_ in self._rows], format="csr") if self._rows else sp.csr_matrix((0, n))
+        lo = np.concatenate([r[1] for r in self._rows]) if self._rows else np.zeros(0)
+        hi = np.concatenate([r[2] for r in self._rows]) if self._rows else np.zeros(0)
+        c = self._obj if self.ModelSense == GRB.MINIMIZE else -self._obj
+        integrality = np.isin(self._vtype, (GRB.BINARY, GRB.INTEGER)).astype(int)
+        return c, A, lo, hi, self._lb.copy(), self._ub.copy(), integrality
+
+    def optimize(self):
+        self._reset_solution()
+        t0 = time.perf_counter()
+        if self.solver == "highs":
+            self._solve_highs()
+        else:
+            self._solve_cbc()
+        self.Runtime = time.perf_counter() - t0
+
+    def _finish(self, status, x, gap=None, nodes=None):
+        self.status = status
+        if x is not None:
+            self._x = np.asarray(x, dtype=float)
+            self.objVal = self.ObjVal = float(self._obj @ self._x + self.ObjCon)
+            self.SolCount = 1
+        self.MIPGap = gap
+        self.NodeCount = nodes
+
+    # --- HiGHS (scipy) ---
+    _HIGHS_STATUS = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}
+
+    def _solve_highs(self):
+        c, A, lo, hi, lb, ub, integrality = self.to_matrices()
+        options = {"disp": bool(self.params.get("OutputFlag"))}
+        if self.params.get("TimeLimit") is not None:
+            options["time_limit"] = float(self.params["TimeLimit"])
+        if self.params.get("MIPGap") is not None:
+            options["mip_rel_gap"] = float(self.params["MIPGap"])
+        constraints = [LinearConstraint(A, lo, hi)] if A.shape[0] else []
+        res = milp(c, constraints=constraints, integrality=integrality, bounds=Bounds(lb, ub), options=options)
+        status = self._HIGHS_STATUS.get(res.status, GRB.NUMERIC)
+        self._finish(status, res.x, getattr(res, "mip_gap", None), getattr(res, "mip_node_count", None))
+
+    # --- CBC (MPS 檔 + cbc 執行檔) ---
+    def write_mps(self, path):
+        """ 以自由格式 MPS 輸出 (變數名稱 C<j>，限制式名稱 R<i>) """
+        c, A, lo, hi, lb, ub, integrality = self.to_matrices()
+        A = A.tocsc()
+        with open(path, "w") as fh:
+            fh.write(f"NAME {self.ModelName or 'MODEL'}\nROWS\n N OBJ\n")
+            kinds = []
+            for i in range(A.shape[0]):
+                if lo[i] == hi[i]: kind = "E"
+                elif np.isinf(lo[i]): kind = "L"
+                elif np.isinf(hi[i]): kind = "G"
+                else: kind = "L"  # 雙邊限制以 RANGES 表示
+                kinds.append(kind)
+                fh.write(f" {kind} R{i}\n")
+            fh.write("COLUMNS\n")
+            in_int = False
+            for j in range(A.shape[1]):
+                if integrality[j] and not in_int:
+                    fh.write(" M1 'MARKER' 'INTORG'\n"); in_int = True
+                elif not integrality[j] and in_int:
+                    fh.write(" M2 'MARKER' 'INTEND'\n"); in_int = False
+                fh.write(f" C{j} OBJ {c[j]:.17g}\n")
+                for k in range(A.indptr[j], A.indptr[j + 1]):
+                    fh.write(f" C{j} R{A.indices[k]} {A.data[k]:.17g}\n")
+            if in_int:
+                fh.write(" M2 'MARKER' 'INTEND'\n")
+            fh.write("RHS\n")
+            for i, kind in enumerate(kinds):
+                rhs = lo[i] if kind == "G" else hi[i]
+                if rhs != 0:
+                    fh.write(f" RHS R{i} {rhs:.17g}\n")
+            fh.write("RANGES\n")
+            for i, kind in enumerate(kinds):
+                if kind == "L" and np.isfinite(lo[i]) and lo[i] != hi[i]:
+                    fh.write(f" RNG R{i} {hi[i] - lo[i]:.17g}\n")
+            fh.write("BOUNDS\n")
+            for j in range(A.shape[1]):
+                if lb[j] == ub[j]:
+                    fh.write(f" FX BND C{j} {lb[j]:.17g}\n")
+                    continue
+                if np.isinf(lb[j]): fh.write(f" MI BND C{j}\n")
+                elif lb[j] != 0: fh.write(f" LO BND C{j} {lb[j]:.17g}\n")
+                if np.isfinite(ub[j]): fh.write(f" UP BND C{j} {ub[j]:.17g}\n")
+                elif integrality[j]: fh.write(f" PL BND C{j}\n")
+            fh.write("ENDATA\n")
+
+    def _solve_cbc(self):
+        exe = shutil.which("cbc")
+        if exe is None:
+            raise RuntimeError("找不到 cbc 執行檔；請安裝 COIN-OR CBC 或改用 highs 後端")
+        with tempfile.TemporaryDirectory() as tmp:
+            mps, sol = os.path.join(tmp, "model.mps"), os.path.join(tmp, "model.sol")
+            self.write_mps(mps)
+            cmd = [exe, mps]
+            if self.params.get("TimeLimit") is not None: cmd += ["sec", str(self.params["TimeLimit"])]
+            if self.params.get("MIPGap") is not None: cmd += ["ratio", str(self.params["MIPGap"])]
+            if self.params.get("Threads"): cmd += ["threads", str(self.params["Threads"])]
+            cmd += ["solve", "solu", sol]
+            out = subprocess.run(cmd, capture_output=True, text=True)
+            if self.params.get("OutputFlag"):
+                print(out.stdout)
+            if not os.path.exists(sol):
+                self._finish(GRB.NUMERIC, None)
+                return
+            with open(sol) as fh:
+                header = fh.readline()
+                x = np.zeros(self.NumVars)
+                for line in fh:
+                    parts = line.replace("**", " ").split()
+                    if len(parts) >= 3 and parts[1].startswith("C"):
+                        x[int(parts[1][1:])] = float(parts[2])
+        if header.startswith("Optimal"):
+            self._finish(GRB.OPTIMAL, x, 0.0)
+        elif header.startswith("Infeasible"):
+            self._finish(GRB.INFEASIBLE, None)
+        elif "objective value" in header:
+            self._finish(GRB.TIME_LIMIT, x)  # 停止於限制但已有可行解
+        else:
+            self._finish(GRB.NUMERIC, None)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+參數化機率掃描 (Exact Parametric Probability Sweep)
+
+固定第一階段方案 x 後，期望成本對情境機率 p 是線性的:
+    cost_x(p) = 投資(x) + p * Q_s(x) + (1 - p) * sum_o w_o * Q_o(x)
+因此 RP 最佳值 F(p) = min_x cost_x(p) 為凹的分段線性函數。
+以下用「交點二分」(Eisner-Severance) 找出 F 的所有轉折點：
+  1. 在 p=0 與 p=1 各解一次 RP，得到兩條直線
+  2. 在兩線交點 p* 再解一次 RP；若最佳值等於交點值，p* 即為轉折點，否則新方案把區間切成兩段遞迴
+每個最佳方案只需 1~2 次 MILP，得到的是精確的機率區間，而不是 ±0.1 的網格結果
+"""
+import pandas as pd
+
+from distflow import ieee13_network
+from planning import DEFAULT_PARAMS, RecourseEvaluator, solve_robust_model
+
+
+def scenarios_at(base_scenarios, s_key, p):
+    """ 情境 s_key 的機率設為 p，其餘情境依原比例分配 1 - p """
+    others = [k for k in base_scenarios if k != s_key]
+    rest = sum(base_scenarios[k]['prob'] for k in others)
+    out = {}
+    for k, sc in base_scenarios.items():
+        sc = dict(sc)
+        if k == s_key:
+            sc['prob'] = p
+        else:
+            w = sc['prob'] / rest if rest > 0 else 1.0 / len(others)
+            sc['prob'] = (1.0 - p) * w
+        out[k] = sc
+    return out
+
+
+class _PlanLine:
+    """ 單一方案的期望成本直線 cost(p) = a + b * p """
+
+    def __init__(self, hardened, dgs, a, b):
+        self.hardened = hardened
+        self.dgs = dgs
+        self.a = a
+        self.b = b
+
+    @property
+    def key(self):
+        return (tuple(sorted(self.hardened)), tuple(sorted(self.dgs)))
+
+    def cost(self, p):
+        return self.a + self.b * p
+
+
+def parametric_probability_sweep(base_scenarios, s_key='S2', net=None, params=DEFAULT_PARAMS,
+                                 cache=None, tol=1e-4):
+    """
+    回傳 (intervals, n_milp)
+      intervals: DataFrame，每列為一個最佳方案及其精確的機率區間 [P_From, P_To]
+      n_milp: 使用的 RP MILP 次數
+    """
+    if net is None: net = ieee13_network()
+    solve = cache.solve_robust_model if cache is not None else solve_robust_model
+    evaluator = RecourseEvaluator(net, params, 1)
+
+    # 權重 w_o (其餘情境分配 1 - p 的比例)
+    others = [k for k in base_scenarios if k != s_key]
+    rest = sum(base_scenarios[k]['prob'] for k in others)
+    weights = {k: (base_scenarios[k]['prob'] / rest if rest > 0 else 1.0 / len(others)) for k in others}
+
+    lines = {}
+    n_milp = 0
+
+    def plan_at(p):
+        nonlocal n_milp
+        res = solve(f"Param_{p:.6f}", scenarios_at(base_scenarios, s_key, p), net, params)
+        n_milp += 1
+        if res is None:
+            raise RuntimeError(f"RP 求解失敗 (p = {p})")
+        key = (tuple(sorted(res['Hardened'])), tuple(sorted(res['New DGs'])))
+        if key not in lines:
+            # 每個情境各自求解第二階段成本 Q_s(x): 合併求解時 MIPGap 只約束總和，個別 Q_s 與轉折點會失準
+            q = dict(zip(base_scenarios, evaluator.scenario_costs(res['Hardened'], res['New DGs'], base_scenarios)))
+            inv = params.invest_cost(len(res['Hardened']), len(res['New DGs']))
+            a = inv + sum(weights[k] * q[k] for k in others)
+            lines[key] = _PlanLine(res['Hardened'], res['New DGs'], a, q[s_key] - (a - inv))
+        return lines[key]
+
+    # 交點二分
+    stack = [(0.0, plan_at(0.0), 1.0, plan_at(1.0))]
+    while stack:
+        lo, A, hi, B = stack.pop()
+        if A.key == B.key or abs(A.b - B.b) < 1e-12:
+            continue
+        p_star = (B.a - A.a) / (A.b - B.b)
+        if not (lo < p_star < hi):
+            continue
+        C = plan_at(p_star)
+        if C.cost(p_star) >= A.cost(p_star) - tol * max(1.0, abs(A.cost(p_star))):
+            continue  # p* 為轉折點
+        stack.append((lo, A, p_star, C))
+        stack.append((p_star, C, hi, B))
+
+    return _lower_envelope(list(lines.values()), tol), n_milp
+
+
+def _lower_envelope(lines, tol):
+    """ 由已知的方案直線計算 [0, 1] 上的下包絡線 """
+    def first_at_zero(cands):
+        best = min(l.a for l in cands)
+        near = [l for l in cands if l.a <= best + tol * max(1.0, abs(best))]
+        return min(near, key=lambda l: l.b)
+
+    rows = []
+    p = 0.0
+    cur = first_at_zero(lines)
+    while True:
+        nxt, p_next = None, 1.0
+        for l in lines:
+            if l.b < cur.b - 1e-12:
+                p_cross = (l.a - cur.a) / (cur.b - l.b)
+                if p < p_cross < p_next or (nxt is not None and abs(p_cross - p_next) < 1e-12 and l.b < nxt.b):
+                    nxt, p_next = l, p_cross
+        rows.append({
+            "P_From": round(p, 6), "P_To": round(p_next, 6),
+            "Hardened": list(cur.hardened), "New DGs": list(cur.dgs),
+            "Cost_From": round(cur.cost(p), 2), "Cost_To": round(cur.cost(p_next), 2),
+        })
+        if nxt is None:
+            break
+        p, cur = p_next, nxt
+    return pd.DataFrame(rows)
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
-import gurobipy as gp
-from gurobipy import GRB
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-import sys, os
+
+import instrumentation
+from planning import calculate_ev_metrics, RecourseEvaluator, RobustModel, set_solver_backend, canonical_attack
+from batch import run_ev_batch
+from solve_cache import SolveCache
+from parametric import parametric_probability_sweep
+from rendering import Renderer
 
 # ==========================================
 # 0. 繪圖樣式設定 (安全模式)
@@ -18,39 +22,7 @@ except OSError:
         plt.style.use('ggplot')
 
 # ==========================================
-# 1. 參數定義 (Parameters)
-# ==========================================
-S_base = 1000.0
-V_base = 4.16
-Z_base = (V_base ** 2) * 1000 / S_base 
-
-node_ids = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
-P_load_kW = {
-    1: 0, 2: 66.67, 3: 85, 4: 100, 5: 56.67, 
-    6: 76.67, 7: 56.67, 8: 100, 9: 142.67, 10: 0, 
-    11: 133.33, 12: 281, 13: 56.67
-}
-P_load_pu = {i: val / S_base for i, val in P_load_kW.items()}
-Q_load_pu = {i: 0 for i in node_ids} 
-
-lines_info = {
-    1: (1, 2),   2: (2, 3),   3: (3, 4),   4: (2, 5),   5: (5, 6),
-    6: (6, 7),   7: (7, 8),   8: (3, 8),   9: (8, 9),   10: (4, 9),
-    11: (2, 10), 12: (10, 11), 13: (11, 12), 14: (12, 13), 15: (3, 13)
-}
-line_ids = list(lines_info.keys())
-
-R_pu = 0.1 / Z_base; X_pu = 0.1 / Z_base; Big_M = 10.0 
-
-# 投資參數
-Cost_DG_kW = 1.5
-Cost_Hard_Line = 400.0
-Cost_Shedding = 14.0
-Budget_H = 1; Budget_G = 1
-DG_Cap_kW = 100.0; DG_Cap_pu = DG_Cap_kW / S_base
-
-# ==========================================
-# 2. 定義測試情境 (Test Cases)
+# 1. 定義測試情境 (Test Cases)
 # ==========================================
 test_cases = [
     ("Scenario_1", {
@@ -80,16 +52,15 @@ test_cases = [
 ]
 
 # ==========================================
-# 3. 攻擊模式編碼與分析工具
+# 2. 攻擊模式編碼與分析工具
 # ==========================================
 def generate_attack_legend(cases):
-    unique_patterns = []
+    # 以 set 判斷是否出現過 (情境很多時，list 的 in 檢查會變成平方時間)
+    unique_patterns = set()
     for _, scens in cases:
         for s_key in scens:
-            atk = tuple(sorted(scens[s_key]['attack']))
-            if atk not in unique_patterns:
-                unique_patterns.append(atk)
-    unique_patterns.sort(key=lambda x: (len(x), x))
+            unique_patterns.add(canonical_attack(scens[s_key]['attack']))
+    unique_patterns = sorted(unique_patterns, key=lambda x: (len(x), x))
     
     legend = {}
     pattern_map = {}
@@ -112,179 +83,9 @@ def print_legend(legend):
 attack_legend, attack_map = generate_attack_legend(test_cases)
 
 # ==========================================
-# 4. 求解函式
-# ==========================================
-def solve_robust_model(case_name, current_scenarios):
-    scenario_keys = list(current_scenarios.keys())
-    model = gp.Model(f"Robust_{case_name}")
-    model.setParam('OutputFlag', 0) 
-
-    y_h = model.addVars(line_ids, vtype=GRB.BINARY, name="y_h") 
-    candidate_nodes = [i for i in node_ids if i != 1]
-    y_g = model.addVars(candidate_nodes, vtype=GRB.BINARY, name="y_g") 
-
-    v = model.addVars(line_ids, scenario_keys, vtype=GRB.BINARY, name="v")
-    P_flow = model.addVars(line_ids, scenario_keys, lb=-10, ub=10, vtype=GRB.CONTINUOUS)
-    Q_flow = model.addVars(line_ids, scenario_keys, lb=-10, ub=10, vtype=GRB.CONTINUOUS)
-    U = model.addVars(node_ids, scenario_keys, lb=0.81, ub=1.21, vtype=GRB.CONTINUOUS)
-    delta_P = model.addVars(node_ids, scenario_keys, lb=0, vtype=GRB.CONTINUOUS)
-    delta_Q = model.addVars(node_ids, scenario_keys, lb=0, vtype=GRB.CONTINUOUS)
-    P_gen = model.addVars(candidate_nodes, scenario_keys, lb=0, ub=DG_Cap_pu, vtype=GRB.CONTINUOUS)
-
-    for s in scenario_keys:
-        U[1, s].lb = 1.0; U[1, s].ub = 1.0 
-        for i in node_ids:
-            delta_P[i, s].ub = P_load_pu[i]
-            delta_Q[i, s].ub = Q_load_pu[i]
-
-    model.addConstr(gp.quicksum(y_h[l] for l in line_ids) <= Budget_H)
-    model.addConstr(gp.quicksum(y_g[i] for i in candidate_nodes) <= Budget_G)
-
-    for s in scenario_keys:
-        attack_set = current_scenarios[s]['attack']
-        for l in line_ids:
-            if l in attack_set: model.addConstr(v[l, s] <= y_h[l])
-        for i in candidate_nodes:
-            model.addConstr(P_gen[i, s] <= DG_Cap_pu * y_g[i])
-
-        for j in node_ids:
-            if j == 1: continue
-            inc = gp.quicksum(P_flow[l, s] for l, (u, v_n) in lines_info.items() if v_n == j)
-            out = gp.quicksum(P_flow[l, s] for l, (u, v_n) in lines_info.items() if u == j)
-            gen = P_gen[j, s] if j in candidate_nodes else 0
-            model.addConstr(inc - out + gen == P_load_pu[j] - delta_P[j, s])
-            
-            inc_q = gp.quicksum(Q_flow[l, s] for l, (u, v_n) in lines_info.items() if v_n == j)
-            out_q = gp.quicksum(Q_flow[l, s] for l, (u, v_n) in lines_info.items() if u == j)
-            model.addConstr(inc_q - out_q == Q_load_pu[j] - delta_Q[j, s])
-
-        for l in line_ids:
-            model.addConstr(P_flow[l, s] <= 10*v[l, s]); model.addConstr(P_flow[l, s] >= -10*v[l, s])
-            model.addConstr(Q_flow[l, s] <= 10*v[l, s]); model.addConstr(Q_flow[l, s] >= -10*v[l, s])
-            u, v_n = lines_info[l]
-            lhs = U[u, s] - U[v_n, s] - 2*(R_pu*P_flow[l, s] + X_pu*Q_flow[l, s])
-            model.addConstr(lhs <= Big_M*(1-v[l, s])); model.addConstr(lhs >= -Big_M*(1-v[l, s]))
-
-        model.addConstr(gp.quicksum(v[l, s] for l in line_ids) <= len(node_ids) - 1)
-
-    cost_inv = Cost_Hard_Line * gp.quicksum(y_h[l] for l in line_ids) + \
-               (Cost_DG_kW * DG_Cap_kW) * gp.quicksum(y_g[i] for i in candidate_nodes)
-
-    expected_shedding_cost = 0
-    for s in scenario_keys:
-        prob = current_scenarios[s]['prob']
-        loss_s = Cost_Shedding * gp.quicksum(delta_P[i, s] for i in node_ids) * S_base
-        switching_s = 0.01 * gp.quicksum(v[l, s] for l in line_ids)
-        expected_shedding_cost += prob * (loss_s + switching_s)
-
-    model.setObjective(cost_inv + expected_shedding_cost, GRB.MINIMIZE)
-    model.optimize()
-
-    if model.status == GRB.OPTIMAL:
-        hardened = [l for l in line_ids if y_h[l].x > 0.5]
-        new_dgs = [i for i in candidate_nodes if y_g[i].x > 0.5]
-        
-        prob1 = current_scenarios['S1']['prob'] if 'S1' in current_scenarios else 1.0
-        prob2 = current_scenarios['S2']['prob'] if 'S2' in current_scenarios else 0.0
-
-        return {
-            "Case Name": case_name,
-            "S1 Prob": prob1, "S2 Prob": prob2,
-            "Hardened": hardened, "New DGs": new_dgs,
-            "Obj Value": round(model.objVal, 2),
-            "Invest ($)": round(cost_inv.getValue(), 2),
-        }
-    else:
-        return None
-
-# ==========================================
-# 5. EV 指標計算函式
+# 3. Phase 5: 敏感度分析 
 # ==========================================
-def evaluate_fixed_plan(fixed_hardened, fixed_dgs, scenarios):
-    scenario_keys = list(scenarios.keys())
-    m = gp.Model("Eval_Fixed")
-    m.setParam('OutputFlag', 0)
-    
-    v = m.addVars(line_ids, scenario_keys, vtype=GRB.BINARY)
-    P_flow = m.addVars(line_ids, scenario_keys, lb=-10, ub=10)
-    Q_flow = m.addVars(line_ids, scenario_keys, lb=-10, ub=10)
-    U = m.addVars(node_ids, scenario_keys, lb=0.81, ub=1.21)
-    delta_P = m.addVars(node_ids, scenario_keys, lb=0)
-    delta_Q = m.addVars(node_ids, scenario_keys, lb=0)
-    P_gen = m.addVars(node_ids, scenario_keys, lb=0, ub=DG_Cap_pu) 
-    
-    for s in scenario_keys:
-        U[1, s].lb=1.0; U[1, s].ub=1.0
-        for i in node_ids: delta_P[i, s].ub = P_load_pu[i]; delta_Q[i, s].ub = Q_load_pu[i]
-
-    for s in scenario_keys:
-        attack_set = scenarios[s]['attack']
-        for l in line_ids:
-            is_invested = 1 if l in fixed_hardened else 0
-            if l in attack_set: m.addConstr(v[l, s] <= is_invested) 
-        for i in node_ids:
-            if i==1: continue
-            has_dg = 1 if i in fixed_dgs else 0
-            m.addConstr(P_gen[i, s] <= DG_Cap_pu * has_dg)
-
-        for j in node_ids:
-            if j==1: continue
-            inc = gp.quicksum(P_flow[l, s] for l, (u, v_n) in lines_info.items() if v_n == j)
-            out = gp.quicksum(P_flow[l, s] for l, (u, v_n) in lines_info.items() if u == j)
-            m.addConstr(inc - out + P_gen[j, s] == P_load_pu[j] - delta_P[j, s])
-            
-            inc_q = gp.quicksum(Q_flow[l, s] for l, (u, v_n) in lines_info.items() if v_n == j)
-            out_q = gp.quicksum(Q_flow[l, s] for l, (u, v_n) in lines_info.items() if u == j)
-            m.addConstr(inc_q - out_q == Q_load_pu[j] - delta_Q[j, s])
-            
-        for l in line_ids:
-            u, v_n = lines_info[l]
-            m.addConstr(P_flow[l, s] <= 10*v[l, s]); m.addConstr(P_flow[l, s] >= -10*v[l, s])
-            m.addConstr(Q_flow[l, s] <= 10*v[l, s]); m.addConstr(Q_flow[l, s] >= -10*v[l, s])
-            lhs = U[u, s] - U[v_n, s] - 2*(R_pu*P_flow[l, s] + X_pu*Q_flow[l, s])
-            m.addConstr(lhs <= Big_M*(1-v[l, s])); m.addConstr(lhs >= -Big_M*(1-v[l, s]))
-            
-        m.addConstr(gp.quicksum(v[l, s] for l in line_ids) <= len(node_ids)-1)
-
-    fixed_inv_cost = Cost_Hard_Line * len(fixed_hardened) + (Cost_DG_kW * 100.0) * len(fixed_dgs)
-    op_cost = 0
-    for s in scenario_keys:
-        prob = scenarios[s]['prob']
-        loss = Cost_Shedding * gp.quicksum(delta_P[i, s] for i in node_ids) * S_base
-        switch = 0.01 * gp.quicksum(v[l, s] for l in line_ids)
-        op_cost += prob * (loss + switch)
-        
-    m.setObjective(fixed_inv_cost + op_cost, GRB.MINIMIZE)
-    m.optimize()
-    return m.objVal if m.status == GRB.OPTIMAL else 9999999.0
-
-def calculate_ev_metrics(case_name, scenarios):
-    rp_result = solve_robust_model(case_name, scenarios)
-    if not rp_result: return None
-    cost_rp = rp_result['Obj Value']
-    
-    ws_total = 0; max_prob = -1; naive_plan = ([], []) 
-    for s_key in scenarios:
-        single_scen_input = {s_key: scenarios[s_key].copy()}
-        single_scen_input[s_key]['prob'] = 1.0 
-        res = solve_robust_model(f"{s_key}_Only", single_scen_input)
-        real_prob = scenarios[s_key]['prob']
-        ws_total += real_prob * res['Obj Value']
-        if real_prob > max_prob:
-            max_prob = real_prob
-            naive_plan = (res['Hardened'], res['New DGs'])
-            
-    cost_eev = evaluate_fixed_plan(naive_plan[0], naive_plan[1], scenarios)
-    evpi = cost_rp - ws_total
-    vss = cost_eev - cost_rp
-    
-    rp_result.update({"WS": round(ws_total, 2), "EEV": round(cost_eev, 2), "EVPI": round(evpi, 2), "VSS": round(vss, 2)})
-    return rp_result
-
-# ==========================================
-# 6. Phase 5: 敏感度分析 
-# ==========================================
-def run_sensitivity_analysis():
+def run_sensitivity_analysis(evaluator=None, cache=None):
     print("\n" + "="*85) # 加寬分隔線
     print("  Phase 5: S2 機率敏感度分析 (0.0 -> 1.0) - 含決策內容對照")
     print("="*85)
@@ -301,14 +102,17 @@ def run_sensitivity_analysis():
     base_attack_s2 = [2, 5, 8, 14, 15]
     
     sensitivity_results = []
+    # 快取: 各機率點的 S1_Only / S2_Only 與重新取得決策的 RP 都不必重算
+    if cache is None: cache = SolveCache()
+    # 暖啟動: 所有機率點 (含 S1_Only / S2_Only) 共用同一個模型，只改目標係數，並以前一點的解作為 MIP Start
+    warm_model = RobustModel({
+        'S1': {'prob': 0.5, 'attack': base_attack_s1},
+        'S2': {'prob': 0.5, 'attack': base_attack_s2}
+    }, case_name="Sweep")
     s2_probs = np.linspace(0.0, 1.0, 11) 
     
     last_decision_str = None
     last_obj_val = -1.0 
-    
-    # 暫時隱藏詳細計算過程
-    original_stdout = sys.stdout
-    sys.stdout = open(os.devnull, 'w') 
 
     for p2 in s2_probs:
         p2 = round(p2, 2)
@@ -320,11 +124,11 @@ def run_sensitivity_analysis():
         }
         
         # 計算 EV 指標
-        res = calculate_ev_metrics(f"Prob_{p2}", current_scens)
+        res = calculate_ev_metrics(f"Prob_{p2}", current_scens, evaluator=evaluator, cache=cache, solver=warm_model)
         
         if res:
             # 重新取得詳細決策
-            solve_res = solve_robust_model(f"Prob_{p2}", current_scenarios=current_scens)
+            solve_res = cache.solve_robust_model(f"Prob_{p2}", current_scenarios=current_scens)
             
             # 格式化決策字串 (排序以確保比對正確)
             raw_h = solve_res['Hardened']
@@ -350,8 +154,6 @@ def run_sensitivity_analysis():
             last_decision_str = current_decision_key
             last_obj_val = current_obj
             
-            # 恢復輸出並印出表格行
-            sys.stdout = original_stdout
             print(
                 f"{p2:<8.1f} | "
                 f"{res['Obj Value']:<9.1f} | "
@@ -360,7 +162,6 @@ def run_sensitivity_analysis():
                 f"{str(raw_g):<10} | "      # 顯示發電機
                 f"{note}"
             )
-            sys.stdout = open(os.devnull, 'w') 
             
             sensitivity_results.append({
                 "S2_Prob": p2, 
@@ -370,18 +171,40 @@ def run_sensitivity_analysis():
                 "New_DGs": str(raw_g)
             })
     
-    sys.stdout = original_stdout
     df_sen = pd.DataFrame(sensitivity_results)
     df_sen.to_csv("Sensitivity_Analysis_S2_Prob.csv", index=False)
     print("-" * 110)
     print("✅ 敏感度分析完成！(決策細節已列出)\n")
     return df_sen
 
+def run_parametric_analysis(cache=None):
+    """ 精確的 S2 機率轉折點 (參數化掃描，不使用網格) """
+    print("\n" + "="*85)
+    print("  Phase 5b: S2 機率精確轉折點 (Parametric Sweep)")
+    print("="*85)
+
+    base_scens = {
+        'S1': {'prob': 0.5, 'attack': [2, 11]},
+        'S2': {'prob': 0.5, 'attack': [2, 5, 8, 14, 15]}
+    }
+    df_param, n_milp = parametric_probability_sweep(base_scens, 'S2', cache=cache)
+
+    print(f"{'S2 Prob 區間':<22} | {'Hardened':<12} | {'New DGs':<10} | {'RP Cost'}")
+    print("-" * 85)
+    for _, row in df_param.iterrows():
+        interval = f"[{row['P_From']:.4f}, {row['P_To']:.4f}]"
+        cost = f"{row['Cost_From']:.1f} -> {row['Cost_To']:.1f}"
+        print(f"{interval:<22} | {str(row['Hardened']):<12} | {str(row['New DGs']):<10} | {cost}")
+    print("-" * 85)
+    print(f"✅ 共使用 {n_milp} 次 MILP 求解\n")
+
+    df_param.to_csv("Parametric_Tipping_Points_S2.csv", index=False)
+    return df_param
+
 # ==========================================
 # 繪圖函式
 # ==========================================
-def plot_charts(df):
-    # 1. VSS Curve 
+def plot_vss_curve(df):
     plt.figure(figsize=(12, 7))
     plt.plot(df['S2_Prob'], df['VSS'], marker='o', color='#2ca02c', label='VSS')
     plt.fill_between(df['S2_Prob'], df['VSS'], alpha=0.3, color='#98df8a')
@@ -403,9 +226,8 @@ def plot_charts(df):
     plt.xlabel('Probability of Scenario 2', fontsize=14); plt.ylabel('Cost Saving ($)', fontsize=14)
     plt.xticks(np.arange(0, 1.1, 0.1)); plt.legend(fontsize=12, loc='upper right')
     plt.grid(True, linestyle='--', alpha=0.7); plt.tight_layout()
-    plt.show()
 
-    # 2. Investment Steps 
+def plot_investment_steps(df):
     plt.figure(figsize=(12, 7))
     plt.step(df['S2_Prob'], df['Invest_Cost'], where='post', linewidth=3, color='#1f77b4', label='Investment Cost')
     
@@ -446,67 +268,102 @@ def plot_charts(df):
     plt.xticks(np.arange(0, 1.1, 0.1)); plt.grid(True, linestyle='--', alpha=0.7)
     plt.ylim(bottom=0, top=df['Invest_Cost'].max()*1.5) # 加高上限以容納文字
     plt.tight_layout()
-    plt.show()
+
+def plot_charts(df, renderer):
+    """ 1. VSS Curve  2. Investment Steps；輸出方式由 rendering.PLOT_MODE 決定 """
+    renderer.submit(plot_vss_curve, df, name="VSS_Curve")
+    renderer.submit(plot_investment_steps, df, name="Investment_Tipping_Points")
 
 # ==========================================
-# 7. 主程式執行 
+# 4. 主程式執行 
 # ==========================================
 
-# 1. 印出攻擊符號表
-print_legend(attack_legend)
+# 平行設定: MAX_WORKERS = None 表示依 CPU 核心數決定，1 表示依序計算
+MAX_WORKERS = None
+THREADS_PER_WORKER = 1
+# 求解快取目錄: None 表示只在記憶體中快取；指定目錄則可跨次執行重用結果
+CACHE_DIR = None
+# 背景繪圖的 process 數: 0 表示在主程式中繪圖；圖檔輸出方式見 rendering.py (環境變數 PLOT_MODE)
+PLOT_WORKERS = 1
+# 求解紀錄 (instrumentation.py): JSON-lines 檔路徑，結束時印出各階段彙總；None 表示不記錄
+PROFILE_PATH = "solver_profile.jsonl"
+# 求解器後端: "gurobi"；沒有 Gurobi 授權時可改為開源的 "highs" 或 "cbc"
+SOLVER_BACKEND = "gurobi"
+
+if __name__ == "__main__":
+    set_solver_backend(SOLVER_BACKEND)
+    if PROFILE_PATH:
+        instrumentation.enable(PROFILE_PATH)
+
+    # 1. 印出攻擊符號表
+    print_legend(attack_legend)
+
+    print("開始批次分析 6 種情境設定...\n")
+
+    # 2. 設定 Phase 4 表格標題
+    header = (
+        f"{'Case Name':<11} | {'S1/S2(Code) Prob':<18} | {'Hardened':<10} | {'New DGs':<8} | "
+        f"{'RP ($)':<9} | {'WS ($)':<9} | {'EEV ($)':<9} | {'EVPI ($)':<9} | {'VSS ($)':<9}"
+    )
+    print(header)
+    print("-" * 115) 
 
-print("開始批次分析 6 種情境設定...\n")
+    final_results = []
 
-# 2. 設定 Phase 4 表格標題
-header = (
-    f"{'Case Name':<11} | {'S1/S2(Code) Prob':<18} | {'Hardened':<10} | {'New DGs':<8} | "
-    f"{'RP ($)':<9} | {'WS ($)':<9} | {'EEV ($)':<9} | {'EVPI ($)':<9} | {'VSS ($)':<9}"
-)
-print(header)
-print("-" * 115) 
+    # 3. 執行 Phase 4 分析 (RP / WS / EEV 子問題平行求解)
+    cache = SolveCache(path=CACHE_DIR)
+    with instrumentation.phase("Phase 4 EV Batch"):
+        batch_results = run_ev_batch(test_cases, max_workers=MAX_WORKERS, threads_per_worker=THREADS_PER_WORKER, cache=cache)
 
-final_results = []
+    for (name, scens), res in zip(test_cases, batch_results):
+        if res:
+            s1_atk = canonical_attack(scens['S1']['attack'])
+            s2_atk = canonical_attack(scens['S2']['attack'])
+            code1 = attack_map.get(s1_atk, "?")
+            code2 = attack_map.get(s2_atk, "?")
+            
+            prob_str = f"{res['S1 Prob']}({code1})/{res['S2 Prob']}({code2})"
+            
+            print(
+                f"{res['Case Name']:<11} | "
+                f"{prob_str:<18} | "
+                f"{str(res['Hardened']):<10} | "
+                f"{str(res['New DGs']):<8} | "
+                f"{res['Obj Value']:<9.1f} | "
+                f"{res['WS']:<9.1f} | "
+                f"{res['EEV']:<9.1f} | "
+                f"{res['EVPI']:<9.1f} | "
+                f"{res['VSS']:<9.1f}"
+            )
+            
+            final_results.append({
+                "Case": res['Case Name'],
+                "RP": res['Obj Value'], "WS": res['WS'], "EEV": res['EEV'], 
+                "EVPI": res['EVPI'], "VSS": res['VSS'],
+                "S1_Prob": res['S1 Prob'], "S1_Code": code1, 
+                "S2_Prob": res['S2 Prob'], "S2_Code": code2,
+                "Hardened": res['Hardened'], "New_DGs": res['New DGs']
+            })
 
-# 3. 執行 Phase 4 分析
-for name, scens in test_cases:
-    res = calculate_ev_metrics(name, scens)
-    
-    if res:
-        s1_atk = tuple(sorted(scens['S1']['attack']))
-        s2_atk = tuple(sorted(scens['S2']['attack']))
-        code1 = attack_map.get(s1_atk, "?")
-        code2 = attack_map.get(s2_atk, "?")
-        
-        prob_str = f"{res['S1 Prob']}({code1})/{res['S2 Prob']}({code2})"
-        
-        print(
-            f"{res['Case Name']:<11} | "
-            f"{prob_str:<18} | "
-            f"{str(res['Hardened']):<10} | "
-            f"{str(res['New DGs']):<8} | "
-            f"{res['Obj Value']:<9.1f} | "
-            f"{res['WS']:<9.1f} | "
-            f"{res['EEV']:<9.1f} | "
-            f"{res['EVPI']:<9.1f} | "
-            f"{res['VSS']:<9.1f}"
-        )
-        
-        final_results.append({
-            "Case": res['Case Name'],
-            "RP": res['Obj Value'], "WS": res['WS'], "EEV": res['EEV'], 
-            "EVPI": res['EVPI'], "VSS": res['VSS'],
-            "S1_Prob": res['S1 Prob'], "S1_Code": code1, 
-            "S2_Prob": res['S2 Prob'], "S2_Code": code2,
-            "Hardened": res['Hardened'], "New_DGs": res['New DGs']
-        })
-
-df = pd.DataFrame(final_results)
-cols = ["Case", "RP", "WS", "EEV", "EVPI", "VSS", "S1_Prob", "S1_Code", "S2_Prob", "S2_Code", "Hardened", "New_DGs"]
-df = df[cols]
-df.to_csv("Robust_Analysis_Summary.csv", index=False)
-
-# 4. 執行 Phase 5 敏感度分析 (含 Tipping Point 表格)
-df_sensitivity = run_sensitivity_analysis()
-
-# 5. 繪製圖表 
-plot_charts(df_sensitivity)
\ No newline at end of file
+    df = pd.DataFrame(final_results)
+    cols = ["Case", "RP", "WS", "EEV", "EVPI", "VSS", "S1_Prob", "S1_Code", "S2_Prob", "S2_Code", "Hardened", "New_DGs"]
+    df = df[cols]
+    df.to_csv("Robust_Analysis_Summary.csv", index=False)
+
+    # 4. 執行 Phase 5 敏感度分析 (含 Tipping Point 表格)
+    # EEV 計算共用同一個第二階段模型 (只更新上下界)
+    evaluator = RecourseEvaluator()
+    with instrumentation.phase("Phase 5 Sensitivity"):
+        df_sensitivity = run_sensitivity_analysis(evaluator, cache)
+
+    # 5. 繪製圖表 (背景繪圖，參數化分析同時進行)
+    with Renderer(max_workers=PLOT_WORKERS) as renderer:
+        plot_charts(df_sensitivity, renderer)
+        with instrumentation.phase("Phase 5 Parametric"):
+            run_parametric_analysis(cache)
+
+    # 6. 求解時間彙總 (各階段、各類求解)
+    if PROFILE_PATH:
+        print(f"\n求解紀錄: {PROFILE_PATH}")
+        print(instrumentation.summary().to_string(index=False))
+        instrumentation.disable()
\ No newline at end of file
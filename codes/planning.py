@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+兩階段韌性規劃模型 (Two-Stage Resilience Planning)
+
+  * solve_robust_model(): 第一階段 (y_h, y_g) + 各情境第二階段的 Extensive Form
+  * RecourseEvaluator / evaluate_fixed_plan(): 固定投資方案後的第二階段期望成本
+  * calculate_ev_metrics(): RP / WS / EEV / EVPI / VSS
+"""
+import time
+from dataclasses import dataclass
+
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+
+from distflow import ieee13_network, add_distflow_block
+import instrumentation
+from milp_backend import BACKENDS, MatrixModel
+from screening import GraphScreen
+from solution import SolutionLayout
+
+# ==========================================
+# 1. 投資參數 (Planning Parameters)
+# ==========================================
+@dataclass(frozen=True)
+class PlanningParams:
+    Cost_DG_kW: float = 1.5        # 發電機 ($/kW)
+    Cost_Hard_Line: float = 400.0  # 強化 ($/Line)
+    Cost_Shedding: float = 14.0    # 停電懲罰 ($/kW)
+    Cost_Switching: float = 0.01   # 開關懲罰 (消除不必要的 ON 狀態)
+    Budget_H: int = 1              # 最多強化幾條線
+    Budget_G: int = 1              # 最多蓋幾台發電機
+    DG_Cap_kW: float = 100.0       # 發電機容量 (kW)
+    Radiality: str = "flow"        # 輻射狀限制寫法 ("count" / "flow" / "parent" / "lazy"，見 radiality.py)
+
+    def dg_cap_pu(self, net):
+        return self.DG_Cap_kW / net.S_base
+
+    def invest_cost(self, n_hardened, n_dgs):
+        return self.Cost_Hard_Line * n_hardened + (self.Cost_DG_kW * self.DG_Cap_kW) * n_dgs
+
+
+DEFAULT_PARAMS = PlanningParams()
+# 會改變模型結構 (限制式、上下界) 的參數；其餘參數只影響目標係數
+STRUCTURAL_FIELDS = ("Budget_H", "Budget_G", "DG_Cap_kW", "Radiality")
+
+# 每個模型使用的求解執行緒數 (None = Gurobi 預設)；平行批次時由各 worker 設定
+SOLVER_THREADS = None
+# 求解器後端: "gurobi" 或開源的 "highs" / "cbc" (見 milp_backend.py，不需要 Gurobi 授權)
+SOLVER_BACKEND = "gurobi"
+
+def set_solver_threads(n):
+    global SOLVER_THREADS
+    SOLVER_THREADS = n
+
+def set_solver_backend(name):
+    global SOLVER_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的求解器後端: {name} (可用: {', '.join(BACKENDS)})")
+    SOLVER_BACKEND = name
+
+def configure_worker(threads, backend="gurobi", profile=None):
+    """
+    process pool 的 initializer: spawn 出來的 worker 不會繼承上面兩個設定
+    profile: instrumentation.worker_state()，使 worker 的求解紀錄寫入同一個檔案 (可省略)
+    """
+    set_solver_threads(threads)
+    set_solver_backend(backend)
+    instrumentation.configure_worker(profile)
+
+def new_model(name):
+    if SOLVER_BACKEND == "gurobi":
+        model = gp.Model(name)
+    else:
+        model = MatrixModel(name, SOLVER_BACKEND)
+    model.setParam('OutputFlag', 0)
+    if SOLVER_THREADS:
+        model.setParam('Threads', SOLVER_THREADS)
+    return model
+
+
+def canonical_attack(attack):
+    """ 與順序、重複無關的攻擊集合表示 """
+    return tuple(sorted({int(l) for l in attack}))
+
+def scenario_cost(net, params, blk):
+    """ 單一情境的營運成本: 停電損失 + 開關懲罰 """
+    return params.Cost_Shedding * net.S_base * blk.shedding() + params.Cost_Switching * blk.switching()
+
+# ==========================================
+# 2. 求解函式
+# ==========================================
+class RobustModel:
+    """
+    可重複求解的 Extensive Form (Persistent Robust Model)
+    成本全部以變數的 Obj 係數表示，因此改變情境機率只需更新目標係數 (set_probabilities)，不必重建模型；
+    solve() 以上一次的最佳解 (y_h, y_g, v) 作為 MIP Start。機率掃描中相鄰的點多半有相同的最佳方案，
+    暖啟動後只需證明最佳性，比每個點重新建模、冷啟動快得多
+    """
+
+    def __init__(self, scenarios, net=None, params=DEFAULT_PARAMS, case_name="Robust"):
+        t0 = time.perf_counter()
+        if net is None: net = ieee13_network()
+        self.net = net
+        self.params = params
+        self.keys = list(scenarios.keys())
+        self._attacks = {canonical_attack(scenarios[s]['attack']): k for k, s in enumerate(self.keys)}
+        candidate_nodes = net.candidate_nodes
+        dg_cap_pu = params.dg_cap_pu(net)
+
+        model = new_model(f"Robust_{case_name}")
+        self.model = model
+
+        # 第一階段變數 (投資決策)
+        self.y_h = model.addMVar(net.n_lines, vtype=GRB.BINARY, name="y_h")
+        self.y_g = model.addMVar(len(candidate_nodes), vtype=GRB.BINARY, name="y_g")
+        model.addConstr(self.y_h.sum() <= params.Budget_H, name="Budget_H")
+        model.addConstr(self.y_g.sum() <= params.Budget_G, name="Budget_G")
+
+        # 第二階段: 每個情境一組 LinDistFlow 區塊
+        self.blocks = []
+        for s in self.keys:
+            blk = add_distflow_block(model, net, s, gen_nodes=candidate_nodes, gen_cap_pu=dg_cap_pu,
+                                     radiality=params.Radiality, max_gens=params.Budget_G)
+            att = net.line_positions(scenarios[s]['attack'])
+            if len(att):
+                model.addConstr(blk.v[att] <= self.y_h[att], name=f"Survive_{s}")
+            model.addConstr(blk.P_gen <= dg_cap_pu * self.y_g, name=f"DG_Logic_{s}")
+            self.blocks.append(blk)
+        model.ModelSense = GRB.MINIMIZE
+        self._probs = [scenarios[s]['prob'] for s in self.keys]
+        self.set_params(params)
+        self.last_solution = None  # 上一次求解的 RobustSolution (暖啟動用)
+        self._layout = None
+        self.build_s = time.perf_counter() - t0  # 尚未計入求解紀錄的建模時間
+
+    def set_params(self, params):
+        """ 改用另一組成本參數 (只更新目標係數)；結構參數 (預算、DG 容量、輻射狀寫法) 不同時需重新建模 """
+        changed = [f for f in STRUCTURAL_FIELDS if getattr(params, f) != getattr(self.params, f)]
+        if changed:
+            raise ValueError(f"結構參數不同，無法只更新目標係數: {', '.join(changed)}")
+        self.params = params
+        self.y_h.Obj = params.Cost_Hard_Line
+        self.y_g.Obj = params.Cost_DG_kW * params.DG_Cap_kW
+        self.set_probabilities(self._probs)
+
+    def set_probabilities(self, probs):
+        """ probs 依 self.keys 的順序；只修改第二階段變數的目標係數 """
+        params, net = self.params, self.net
+        self._probs = list(probs)
+        for blk, prob in zip(self.blocks, probs):
+            blk.delta_P.Obj = prob * params.Cost_Shedding * net.S_base
+            blk.v.Obj = prob * params.Cost_Switching
+
+    def probabilities_for(self, current_scenarios):
+        """ 依攻擊集合對應到本模型的區塊；有模型中沒有的攻擊集合時回傳 None (未列出的區塊機率為 0) """
+        probs = np.zeros(len(self.keys))
+        for sc in current_scenarios.values():
+            k = self._attacks.get(canonical_attack(sc['attack']))
+            if k is None:
+                return None
+            probs[k] += sc['prob']
+        return probs
+
+    def solve(self, case_name, current_scenarios):
+        """ 更新機率、以上一個解暖啟動後求解；回傳與 solve_robust_model 相同的 dict (失敗時為 None) """
+        t0 = time.perf_counter()
+        probs = self.probabilities_for(current_scenarios)
+        if probs is None:
+            raise ValueError("情境中有此模型沒有的攻擊集合")
+        self.set_probabilities(probs)
+        inc = self.last_solution
+        if inc is not None:
+            self.y_h.Start, self.y_g.Start = inc.y_h, inc.y_g
+            for k, blk in enumerate(self.blocks):
+                blk.v.Start = inc.v[:, k]
+        instrumentation.solve(self.model, "RP", self.build_s + time.perf_counter() - t0)
+        self.build_s = 0.0
+
+        if self.model.status != GRB.OPTIMAL:
+            self.last_solution = None
+            return None
+        self.last_solution = self.solution()
+        return _robust_result(case_name, current_scenarios, self.params, self.last_solution)
+
+    def solution(self, duals=False):
+        """ 目前的解 (RobustSolution，情境依 self.keys 的順序)；所有變數值以一次 getAttr 取回 """
+        if self._layout is None:
+            self._layout = SolutionLayout(self.model, self.net, self.blocks, self.keys, self.y_h, self.y_g)
+        return self._layout.extract(self.model, duals)
+
+    def solve_robust_model(self, case_name, current_scenarios, net=None, params=None):
+        """ 與 solve_robust_model 相同介面；網路、參數不同或有未知的攻擊集合時改為重新建模求解 """
+        same = ((net is None or net is self.net or net.fingerprint() == self.net.fingerprint())
+                and (params is None or params == self.params))
+        if same and self.probabilities_for(current_scenarios) is not None:
+            return self.solve(case_name, current_scenarios)
+        return solve_robust_model(case_name, current_scenarios, net, params or DEFAULT_PARAMS)
+
+
+def _robust_result(case_name, current_scenarios, params, sol):
+    hardened, new_dgs = sol.hardened, sol.new_dgs
+
+    prob1 = current_scenarios['S1']['prob'] if 'S1' in current_scenarios else 1.0
+    prob2 = current_scenarios['S2']['prob'] if 'S2' in current_scenarios else 0.0
+
+    return {
+        "Case Name": case_name,
+        "S1 Prob": prob1, "S2 Prob": prob2,
+        "Hardened": hardened, "New DGs": new_dgs,
+        "Obj Value": round(sol.obj, 2),
+        "Invest ($)": round(params.invest_cost(len(hardened), len(new_dgs)), 2),
+    }
+
+def build_robust_model(case_name, current_scenarios, net=None, params=DEFAULT_PARAMS):
+    """ 建立 Extensive Form 但不求解，回傳 (model, y_h, y_g) """
+    rm = RobustModel(current_scenarios, net, params, case_name)
+    return rm.model, rm.y_h, rm.y_g
+
+def solve_robust_model(case_name, current_scenarios, net=None, params=DEFAULT_PARAMS):
+    if net is None: net = ieee13_network()
+    rm = RobustModel(current_scenarios, net, params, case_name)
+    instrumentation.solve(rm.model, "RP", rm.build_s)
+
+    if rm.model.status == GRB.OPTIMAL:
+        return _robust_result(case_name, current_scenarios, params, rm.solution())
+    else:
+        return None
+
+def solve_wait_and_see(case_name, current_scenarios, net=None, params=DEFAULT_PARAMS):
+    """ solve_robust_model，但求解紀錄標記為 WS (平行批次中單獨送出的 WS 子問題) """
+    with instrumentation.solve_kind("WS"):
+        return solve_robust_model(case_name, current_scenarios, net, params)
+
+# ==========================================
+# 3. EV 指標計算函式
+# ==========================================
+class RecourseEvaluator:
+    """
+    固定投資方案的第二階段模型 (Persistent Recourse Model)
+    模型只建立一次；每次評估只修改變數上下界 (v.ub, P_gen.ub) 與目標係數，並以上一次的開關狀態作為 MIP Start
+    relax=True 時開關 v 為連續變數 (LP 鬆弛)，得到的是第二階段成本的下界
+    screen=True 時先以圖論篩選 (screening.py) 直接求出可證明最佳的情境，只有其餘情境才解 MILP
+    """
+
+    def __init__(self, net=None, params=DEFAULT_PARAMS, n_scenarios=0, relax=False, screen=True):
+        t0 = time.perf_counter()
+        if net is None: net = ieee13_network()
+        self.net = net
+        self.params = params
+        self.relax = relax
+        self.candidate_nodes = net.candidate_nodes
+        self.dg_cap_pu = params.dg_cap_pu(net)
+        self.screen = GraphScreen(net, params) if screen and not relax else None
+        self.n_screened = 0  # 累計由篩選直接求得的情境數
+
+        self.model = new_model("Eval_Fixed")
+        self.blocks = []
+        self._layout = None
+        self._last_v = None
+        self.last_costs = {}
+        self._ensure_blocks(n_scenarios)
+        self.build_s = time.perf_counter() - t0  # 尚未計入求解紀錄的建模 / 更新時間
+
+    def _ensure_blocks(self, n):
+        """ 情境數超過目前的區塊數時才新增區塊 """
+        while len(self.blocks) < n:
+            blk = add_distflow_block(self.model, self.net, f"s{len(self.blocks)}",
+                                     gen_nodes=self.candidate_nodes, gen_cap_pu=self.dg_cap_pu,
+                                     radiality=self.params.Radiality)
+            if self.relax:
+                blk.relax()
+            self.blocks.append(blk)
+            self._layout = None
+            self._last_v = None
+
+    def evaluate(self, fixed_hardened, fixed_dgs, scenarios):
+        t0 = time.perf_counter()
+        net, params = self.net, self.params
+        invest = params.invest_cost(len(fixed_hardened), len(fixed_dgs))
+
+        # 1. 圖論篩選: 可證明最佳的情境不進 MILP
+        screened = {}
+        if self.screen is not None:
+            for s, sc in scenarios.items():
+                res = self.screen.screen(sc['attack'], fixed_hardened, fixed_dgs)
+                if res is not None:
+                    screened[s] = res.cost
+            self.n_screened += len(screened)
+        keys = [s for s in scenarios if s not in screened]
+        screened_total = sum(scenarios[s]['prob'] * q for s, q in screened.items())
+        if not keys:
+            self.last_costs = dict(screened)
+            return invest + screened_total
+
+        # 2. 其餘情境: MILP
+        self._ensure_blocks(len(keys))
+        hardened = set(fixed_hardened)
+        gen_ub = np.array([self.dg_cap_pu if i in fixed_dgs else 0.0 for i in self.candidate_nodes])
+
+        for k, blk in enumerate(self.blocks):
+            if k < len(keys):
+                # 被攻擊且未強化的線路必須斷開；沒有發電機的節點出力為 0
+                sc = scenarios[keys[k]]
+                blk.open_lines([l for l in sc['attack'] if l not in hardened])
+                blk.P_gen.ub = gen_ub
+                prob = sc['prob']
+            else:
+                # 多出來的區塊: 全部斷開且不計成本
+                blk.open_lines(net.line_ids)
+                blk.P_gen.ub = 0.0
+                prob = 0.0
+            blk.delta_P.Obj = prob * params.Cost_Shedding * net.S_base
+            blk.v.Obj = prob * params.Cost_Switching
+            if self._last_v is not None and not self.relax:
+                blk.v.Start = np.minimum(self._last_v[:, k], blk.v.ub)
+
+        self.model.ObjCon = invest + screened_total
+        instrumentation.solve(self.model, "EEV", self.build_s + time.perf_counter() - t0)
+        self.build_s = 0.0
+
+        if self.model.status != GRB.OPTIMAL:
+            self._last_v = None
+            self.last_costs = {}
+            return 9999999.0
+
+        sol = self.solution()
+        self._last_v = sol.v
+        self.last_costs = dict(zip(keys, sol.scenario_costs(params, net.S_base)))
+        self.last_costs.update(screened)
+        self.last_costs = {s: self.last_costs[s] for s in scenarios}
+        return self.model.objVal
+
+    def solution(self, duals=False):
+        """ 上一次 MILP (或 LP 鬆弛) 的解；第 k 欄為第 k 個區塊 (只有未被篩選的情境依序佔用前面的區塊) """
+        if self._layout is None:
+            self._layout = SolutionLayout(self.model, self.net, self.blocks,
+                                          [f"s{k}" for k in range(len(self.blocks))])
+        return self._layout.extract(self.model, duals)
+
+    def scenario_costs(self, fixed_hardened, fixed_dgs, scenarios):
+        """
+        各情境的第二階段成本 Q_s (依 scenarios 的順序，回傳 ndarray)，適合大量的樣本外評估
+        每次只放一個情境: 多個區塊合併求解時 MIPGap 作用在總和上，個別情境的成本會失準，實測也不會比較快
+        """
+        out = np.empty(len(scenarios))
+        for i, (s, sc) in enumerate(scenarios.items()):
+            if self.evaluate(fixed_hardened, fixed_dgs, {s: dict(sc, prob=1.0)}) >= 9999999.0:
+                raise RuntimeError(f"情境 {s} 的第二階段求解失敗")
+            out[i] = self.last_costs[s]
+        return out
+
+
+def evaluate_fixed_plan(fixed_hardened, fixed_dgs, scenarios, net=None, params=DEFAULT_PARAMS, evaluator=None):
+    if evaluator is None:
+        evaluator = RecourseEvaluator(net, params, len(scenarios))
+    return evaluator.evaluate(fixed_hardened, fixed_dgs, scenarios)
+
+def single_scenario(scenarios, s_key):
+    """ Wait-and-See 子問題: 只保留情境 s_key 並將其機率設為 1 """
+    single_scen_input = {s_key: scenarios[s_key].copy()}
+    single_scen_input[s_key]['prob'] = 1.0
+    return single_scen_input
+
+def naive_plan(scenarios, ws_results):
+    """ 機率最高情境的 Wait-and-See 決策 (EEV 使用的方案) """
+    max_prob = -1; plan = ([], [])
+    for s_key in scenarios:
+        if scenarios[s_key]['prob'] > max_prob:
+            max_prob = scenarios[s_key]['prob']
+            plan = (ws_results[s_key]['Hardened'], ws_results[s_key]['New DGs'])
+    return plan
+
+def ev_summary(rp_result, scenarios, ws_results, cost_eev):
+    """ 由 RP / WS / EEV 的求解結果組合 EV 指標 """
+    cost_rp = rp_result['Obj Value']
+    ws_total = sum(scenarios[s_key]['prob'] * ws_results[s_key]['Obj Value'] for s_key in scenarios)
+    evpi = cost_rp - ws_total
+    vss = cost_eev - cost_rp
+
+    result = dict(rp_result)
+    result.update({"WS": round(ws_total, 2), "EEV": round(cost_eev, 2), "EVPI": round(evpi, 2), "VSS": round(vss, 2)})
+    return result
+
+def calculate_ev_metrics(case_name, scenarios, net=None, params=DEFAULT_PARAMS, evaluator=None, cache=None,
+                         solver=None):
+    """
+    cache: 具有 solve_robust_model / evaluate_fixed_plan 方法的 SolveCache (可省略)
+    solver: 取代 solve_robust_model 的求解器，例如機率掃描時重複使用的 RobustModel (可省略)
+    """
+    if cache is not None:
+        solve = lambda *args: cache.solve_robust_model(*args, solver=solver)
+    else:
+        solve = solver.solve_robust_model if solver is not None else solve_robust_model
+    evaluate = cache.evaluate_fixed_plan if cache is not None else evaluate_fixed_plan
+
+    rp_result = solve(case_name, scenarios, net, params)
+    if not rp_result: return None
+
+    with instrumentation.solve_kind("WS"):
+        ws_results = {s_key: solve(f"{s_key}_Only", single_scenario(scenarios, s_key), net, params)
+                      for s_key in scenarios}
+    plan = naive_plan(scenarios, ws_results)
+    cost_eev = evaluate(plan[0], plan[1], scenarios, net, params, evaluator)
+    return ev_summary(rp_result, scenarios, ws_results, cost_eev)
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+放射狀第二階段的批次向量化評估 (Vectorized Radial Recourse)
+
+固定投資方案 (強化線路、DG) 後，以 (情境, 線路) / (情境, 節點) 的 NumPy 陣列一次處理整批情境，不建 MILP:
+  1. BFS 建出放射狀的樹: 根節點的樹先不經過 DG，再由根節點到不了的 DG 成島；只有到不了的負載才經過零負載的節點
+  2. backward sweep: 子樹負載即為線路潮流；子樹沒有負載的線路斷開，電源到不了的負載全部卸載，
+     超過容量且與其他電源不相連的 DG 島依比例卸載超出的部分
+  3. forward sweep: 由電源往下累減電壓平方 (根節點 U = 1；DG 島的電源電壓可在上下界間選擇)
+  4. 檢查潮流上下界與電壓。DG 不供應虛功，虛功只由根節點的樹供應；不可行時改為虛功全部卸載
+     (delta_Q 沒有成本，成本不變)
+
+最佳性: 每個供電的有負載節點 (電源除外) 都需要一條閉合線路 (它在樹中的父線路)，必要的連接點亦然；
+停電懲罰大於接上負載所需的開關懲罰時 (與 GraphScreen 的條件相同)，停電 + 開關的最小值因此有一個下界。
+達到下界的情境即為最佳解 (exact)；需要選擇的情境 (可繞過的連接點、可單獨成島的 DG、DG 島要整個卸載哪些節點、
+電壓或容量限制起作用) 才逐一解 MILP (RecourseEvaluator)
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from distflow import V_MIN_SQ, V_MAX_SQ, ieee13_network, line_flow_bounds
+from planning import DEFAULT_PARAMS, RecourseEvaluator
+from scenario_store import ScenarioStore
+
+
+@dataclass
+class RadialBatch:
+    """ 一批情境的第二階段結果；第一個維度為情境 (順序同 keys) """
+    keys: list
+    cost: np.ndarray      # (情境,) 第二階段成本 (停電 + 開關)
+    exact: np.ndarray     # (情境,) True = 由 sweep 求得；False = 改解 MILP (fallback=False 時未求解，flows=False 時只有成本)
+    v: np.ndarray         # (情境, 線路) 閉合的線路
+    P_flow: np.ndarray    # (情境, 線路) p.u.，正值為 from -> to
+    Q_flow: np.ndarray
+    U: np.ndarray         # (情境, 節點) 電壓平方；sweep 求得的情境中未供電的節點為 NaN
+    delta_P: np.ndarray   # (情境, 節點) 卸載 (p.u.)
+
+    def shed_kW(self, S_base):
+        return self.delta_P.sum(axis=1) * S_base
+
+    def expected_cost(self, probs):
+        return float(np.dot(probs, self.cost))
+
+
+class RadialRecourse:
+    """
+    固定方案 (hardened, dgs) 下整批情境的第二階段成本與潮流
+    evaluate(..., fallback=False) 不解 MILP，無法由 sweep 求得的情境成本為 NaN；
+    flows=False 時 MILP 情境只求成本 (可先經圖論篩選)，不取回潮流與電壓
+    """
+
+    def __init__(self, net=None, params=DEFAULT_PARAMS, tol=1e-9):
+        if net is None: net = ieee13_network()
+        self.net = net
+        self.params = params
+        self.tol = tol
+        self.dg_cap_pu = params.dg_cap_pu(net)
+        # 與 RecourseEvaluator 的區塊相同的潮流上下界 (發電機節點為全部候選節點)
+        self.P_lb, self.P_ub, self.Q_lb, self.Q_ub = line_flow_bounds(net, net.candidate_nodes, self.dg_cap_pu)
+        self._milp = {}  # screen -> RecourseEvaluator
+
+        # 與 GraphScreen 相同: 停電懲罰大於接上任一負載所需的開關懲罰時，「全部供電」才必定是最佳
+        load = net.P_load_pu
+        zero = int(np.sum(load <= tol)) - int(load[net.root_pos] <= tol)
+        positive = load[load > tol]
+        self.valid = (len(positive) == 0 or
+                      params.Cost_Shedding * net.S_base * positive.min() > params.Cost_Switching * (zero + 1))
+        self._drop_margin = params.Cost_Switching * (zero + 1) / (params.Cost_Shedding * net.S_base)
+
+    # --- 輸入 ---
+    def attack_matrix(self, scenarios):
+        """
+        情境 -> (keys, (情境, 線路) 的攻擊矩陣)
+        scenarios 為 dict、ScenarioStore 或 (情境, 線路) 的布林攻擊矩陣 (keys 為列號)
+        """
+        net = self.net
+        if isinstance(scenarios, np.ndarray):
+            return list(range(len(scenarios))), scenarios.astype(bool)
+        if isinstance(scenarios, ScenarioStore):
+            bits = np.unpackbits(scenarios.masks, axis=1, count=len(scenarios.line_ids)).astype(bool)
+            attacked = np.zeros((len(scenarios), net.n_lines), dtype=bool)
+            attacked[:, net.line_positions(scenarios.line_ids)] = bits
+            return [name for name, _ in scenarios.iter_scenarios()], attacked
+        keys = list(scenarios)
+        attacked = np.zeros((len(keys), net.n_lines), dtype=bool)
+        for i, s in enumerate(keys):
+            if len(scenarios[s]['attack']):
+                attacked[i, net.line_positions(scenarios[s]['attack'])] = True
+        return keys, attacked
+
+    # --- 主流程 ---
+    def evaluate(self, hardened, dgs, scenarios, fallback=True, flows=True):
+        """ 回傳 RadialBatch """
+        net = self.net
+        N, L = net.n_nodes, net.n_lines
+        keys, attacked = self.attack_matrix(scenarios)
+        S = len(keys)
+        alive = ~(attacked & ~np.isin(net.line_ids, list(hardened))[None, :])
+
+        out = RadialBatch(
+            keys=keys, cost=np.full(S, np.nan), exact=np.zeros(S, dtype=bool),
+            v=np.zeros((S, L), dtype=bool), P_flow=np.zeros((S, L)), Q_flow=np.zeros((S, L)),
+            U=np.full((S, N), np.nan), delta_P=np.zeros((S, N)),
+        )
+        if self.valid and S:
+            self._sweep(alive, dgs, out)
+
+        rest = np.flatnonzero(~out.exact)
+        if fallback and len(rest):
+            self._solve_milp(rest, keys, attacked, hardened, dgs, out, flows)
+        return out
+
+    def scenario_costs(self, hardened, dgs, scenarios):
+        """ 與 RecourseEvaluator.scenario_costs 相同: 各情境的第二階段成本 (ndarray，依 scenarios 的順序) """
+        return self.evaluate(hardened, dgs, scenarios, flows=False).cost
+
+    # --- 1 ~ 4. BFS 與 sweep ---
+    def _sweep(self, alive, dgs, out):
+        net, params, tol = self.net, self.params, self.tol
+        S, L = alive.shape
+        N = net.n_nodes
+        fp, tp = net.from_pos, net.to_pos
+        load = net.P_load_pu
+
+        root = np.arange(N) == net.root_pos
+        dg = np.zeros(N, dtype=bool)
+        if len(dgs):
+            dg[net.node_positions(list(dgs))] = True
+        src = root | dg
+        zero = (load <= tol) & ~src
+        # DG 單獨成島少一次開關；島內負載超過 island_cap 時，卸載的損失必定大於這次開關
+        island_cap = self.dg_cap_pu + params.Cost_Switching / (params.Cost_Shedding * net.S_base)
+
+        # 1. BFS: 根節點的樹先不經過 DG (讓 DG 盡量成為葉節點而能單獨成島)，再經過 DG；
+        #    接著由根節點到不了的 DG 成島。以上都只經過有負載的節點，到不了的負載才經過零負載的節點 (連接點)
+        depth = np.where(np.broadcast_to(root, (S, N)), 0, -1)
+        parent = np.full((S, N), -1)
+        pline = np.full((S, N), -1)
+        owner = np.where(depth == 0, net.root_pos, -1)  # 所屬電源的節點位置
+        self._grow(alive, ~zero & ~dg, depth, parent, pline, owner)
+        self._grow(alive, ~zero, depth, parent, pline, owner)
+        s, n = np.nonzero(dg[None, :] & (depth < 0))
+        depth[s, n] = 0
+        owner[s, n] = n
+        self._grow(alive, ~zero, depth, parent, pline, owner)
+        self._grow(alive, np.ones(N, dtype=bool), depth, parent, pline, owner)
+
+        def backward(W):
+            """ 2. backward sweep: 各節點的子樹總和 """
+            W = W.copy()
+            for k in range(int(depth.max()), 0, -1):
+                s, n = np.nonzero(depth == k)
+                np.add.at(W, (s, parent[s, n]), W[s, n])
+            return W
+
+        # 根節點樹中的 DG 若下游沒有負載且容量足夠，改為單獨成島
+        W_P = backward(np.where(depth >= 0, load[None, :], 0.0))
+        s, n = np.nonzero(dg[None, :] & (depth > 0) & (W_P <= load[None, :] + tol) & (load[None, :] <= island_cap))
+        depth[s, n] = 0
+        parent[s, n] = pline[s, n] = -1
+        owner[s, n] = n
+        is_src = depth == 0
+        levels = [np.nonzero(depth == k) for k in range(1, int(depth.max()) + 1)]
+
+        # 超過容量的 DG 島: 若與其他電源不相連，至少要卸載超出的部分 (各節點依比例卸載)
+        W_all = backward(np.where(depth >= 0, load[None, :], 0.0))
+        over = is_src & ~root[None, :] & (W_all > self.dg_cap_pu + tol)
+        o_f, o_t = owner[:, fp], owner[:, tp]
+        s, l = np.nonzero(alive & (o_f != o_t) & (o_f >= 0) & (o_t >= 0))
+        touched = np.zeros((S, N), dtype=bool)
+        touched[s, o_f[s, l]] = touched[s, o_t[s, l]] = True
+        ratio = np.where(over & ~touched, self.dg_cap_pu / np.maximum(W_all, tol), 1.0)
+        served = np.where(depth >= 0, load[None, :] * np.take_along_axis(ratio, np.maximum(owner, 0), axis=1), 0.0)
+
+        # 只有子樹有負載的節點才供電；DG 不供應虛功
+        W_P = backward(served)
+        fed = (depth >= 0) & ((W_P > tol) | is_src)
+        child = fed & (depth > 0)
+        in_root = owner == net.root_pos
+        W_Q = backward(np.where(fed & in_root, net.Q_load_pu[None, :], 0.0))
+
+        # 達到下界的條件:
+        #   超過容量的 DG 島不與其他電源相連，且島內任一負載都大於超出量 (整個節點卸載不會比依比例卸載便宜)
+        #   用到的連接點都是必要的 (移除後有負載到不了任何電源)
+        #   根節點樹中的 DG 無法單獨成島 (移除後才到不了電源的負載加上自身負載超過容量)
+        excess = np.where(over, W_all - self.dg_cap_pu, 0.0)
+        need = np.take_along_axis(excess, np.maximum(owner, 0), axis=1) + self._drop_margin
+        exact = ~np.any(over & touched, axis=1)
+        exact &= ~np.any(child & (load[None, :] > tol) & (owner >= 0) & (load[None, :] <= need) &
+                         np.take_along_axis(over, np.maximum(owner, 0), axis=1), axis=1)
+        for z in np.flatnonzero(zero | dg):
+            used = np.flatnonzero(child[:, z])
+            if len(used) == 0:
+                continue
+            cut = np.where(np.broadcast_to(src & (np.arange(N) != z), (len(used), N)), 0, -1)
+            self._grow(alive[used], np.arange(N) != z, cut)
+            lost = np.where(fed[used] & (cut < 0) & (np.arange(N) != z), load[None, :], 0.0).sum(axis=1)
+            exact[used] &= (lost > tol) if zero[z] else (lost + load[z] > island_cap)
+
+        # 各線路的潮流 (父 -> 子為正，換算成 from -> to 的方向)
+        s, n = np.nonzero(child)
+        l = pline[s, n]
+        sign = np.where(fp[l] == parent[s, n], 1.0, -1.0)
+        v = np.zeros((S, L), dtype=bool)
+        P = np.zeros((S, L)); Q = np.zeros((S, L))
+        v[s, l] = True
+        P[s, l] = sign * W_P[s, n]
+        Q[s, l] = sign * W_Q[s, n]
+
+        # 3. forward sweep: 相對於電源的電壓平方降 (含 / 不含虛功)
+        drop_PQ = np.zeros((S, N)); drop_P = np.zeros((S, N))
+        for s, n in levels:
+            keep = child[s, n]
+            s, n = s[keep], n[keep]
+            l, p = pline[s, n], parent[s, n]
+            drop_P[s, n] = drop_P[s, p] + 2 * net.R_pu[l] * W_P[s, n]
+            drop_PQ[s, n] = drop_PQ[s, p] + 2 * (net.R_pu[l] * W_P[s, n] + net.X_pu[l] * W_Q[s, n])
+
+        rows = np.broadcast_to(np.arange(S)[:, None], (S, N))
+        def feasible(drop, Q):
+            """ 4. 電壓與潮流上下界；回傳 (可行, 各節點所屬電源的電壓) """
+            worst = np.zeros((S, N))
+            np.maximum.at(worst, (rows[fed], owner[fed]), drop[fed])
+            head = np.clip(V_MIN_SQ + worst, 1.0, V_MAX_SQ)
+            head[:, net.root_pos] = 1.0
+            v_ok = np.all(head - worst >= V_MIN_SQ - tol, axis=1)
+            flow_ok = np.all((P >= self.P_lb - tol) & (P <= self.P_ub + tol) &
+                             (Q >= self.Q_lb - tol) & (Q <= self.Q_ub + tol), axis=1)
+            return v_ok & flow_ok, np.take_along_axis(head, np.maximum(owner, 0), axis=1)
+
+        ok_PQ, head_PQ = feasible(drop_PQ, Q)
+        ok_P, head_P = feasible(drop_P, np.zeros_like(Q))
+        use_Q = ok_PQ[:, None]
+        exact &= ok_PQ | ok_P
+
+        shed = load[None, :] - np.where(fed, served, 0.0)
+        cost = params.Cost_Shedding * net.S_base * shed.sum(axis=1) + params.Cost_Switching * v.sum(axis=1)
+        U = np.where(fed, np.where(use_Q, head_PQ - drop_PQ, head_P - drop_P), np.nan)
+        out.exact[:] = exact
+        out.cost[exact] = cost[exact]
+        out.v[exact] = v[exact]
+        out.P_flow[exact] = P[exact]
+        out.Q_flow[exact] = np.where(use_Q, Q, 0.0)[exact]
+        out.U[exact] = U[exact]
+        out.delta_P[exact] = shed[exact]
+
+    def _grow(self, alive, allowed, depth, parent=None, pline=None, owner=None):
+        """
+        從已到達的節點 (depth >= 0) 沿存活線路繼續 BFS，只進入 allowed 的節點；
+        同一節點同時被多條線路到達時取第一條 (就地更新 depth 等陣列)
+        """
+        fp, tp = self.net.from_pos, self.net.to_pos
+        N = depth.shape[1]
+        front = depth >= 0
+        while True:
+            hits = []
+            for a, b in ((fp, tp), (tp, fp)):
+                s, l = np.nonzero(alive & front[:, a] & (depth[:, b] < 0) & allowed[b])
+                hits.append((s, l, a[l], b[l]))
+            s, l, a, b = (np.concatenate(x) for x in zip(*hits))
+            if len(s) == 0:
+                return
+            _, first = np.unique(s * N + b, return_index=True)
+            s, l, a, b = s[first], l[first], a[first], b[first]
+            depth[s, b] = depth[s, a] + 1
+            if parent is not None:
+                parent[s, b] = a
+                pline[s, b] = l
+                owner[s, b] = owner[s, a]
+            front = np.zeros_like(front)
+            front[s, b] = True
+
+    # --- 5. MILP 後援 ---
+    def _solve_milp(self, rows, keys, attacked, hardened, dgs, out, flows):
+        """ 逐一以 RecourseEvaluator 求解其餘情境；需要潮流時不做圖論篩選 (篩選得到的情境沒有完整的解) """
+        net = self.net
+        screen = not flows
+        if screen not in self._milp:
+            self._milp[screen] = RecourseEvaluator(net, self.params, 1, screen=screen)
+        ev = self._milp[screen]
+        for i in rows:
+            attack = [net.line_ids[k] for k in np.flatnonzero(attacked[i])]
+            ev.evaluate(hardened, dgs, {keys[i]: {'prob': 1.0, 'attack': attack}})
+            if keys[i] not in ev.last_costs:
+                raise RuntimeError(f"情境 {keys[i]} 的第二階段求解失敗")
+            out.cost[i] = ev.last_costs[keys[i]]
+            if not flows:
+                continue
+            sol = ev.solution()
+            out.v[i] = sol.v[:, 0] > 0.5
+            out.P_flow[i] = sol.P_flow[:, 0]
+            out.Q_flow[i] = sol.Q_flow[:, 0]
+            out.U[i] = sol.U[:, 0]
+            out.delta_P[i] = sol.delta_P[:, 0]
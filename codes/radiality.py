@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+輻射狀限制 (Radiality Formulations)
+
+原本的 No_Loops 限制 sum(v) <= N - 1 只限制了閉合線路的「數量」，
+並不能阻止局部形成迴路 (例如另一處斷開兩條線，就可以在別處多閉合一個環)，LP 鬆弛也很弱。
+允許孤島時，正確的拓撲應為「森林」(每個連通元件都是樹)，以下提供可選的寫法:
+  * "count" : 原本的 sum(v) <= N - 1 (保留作為對照；不保證無迴路)
+  * "flow"  : (預設) 單一商品流 (single-commodity flow)。加入虛擬根節點，連到實際根節點與任一節點 (孤島的根 w_i)；
+              每個節點消耗 1 單位虛擬流量，且 sum(v) + sum(w) = N → 擴充後的圖為生成樹，原圖即為森林
+  * "parent": 父節點變數 (spanning-tree / parent variables)。每條閉合線路選一個方向 beta，
+              每個節點恰有一個父節點 (某條線路或虛擬根 w_i)，並以深度變數 (MTZ) 排除有向環
+  * "lazy"  : 保留 count 限制，求解時由 callback 找出整數解中的迴路 C 並加入 sum(v_C) <= |C| - 1 (僅限 gurobi)
+使用 "lazy" 時，模型需以本模組的 optimize(model) 求解，callback 才會生效
+"""
+from gurobipy import GRB
+import numpy as np
+import scipy.sparse as sp
+
+RADIALITY_METHODS = ("count", "flow", "parent", "lazy")
+
+
+def add_radiality(model, net, v, method="flow", sfx=""):
+    """ 對一組開關變數 v (依 net 的線路順序) 加入輻射狀限制；回傳額外建立的二元變數 (LP 鬆弛時一併放寬) """
+    N, L = net.n_nodes, net.n_lines
+
+    if method == "count" or method == "lazy":
+        model.addConstr(v.sum() <= N - 1, name=f"No_Loops{sfx}")
+        if method == "lazy":
+            if not hasattr(model, "cbLazy"):
+                raise ValueError("lazy 輻射狀限制需要 gurobi 後端 (callback)")
+            model.setParam('LazyConstraints', 1)
+            model._loop_blocks = getattr(model, "_loop_blocks", []) + [(net, v)]
+        return []
+
+    # w_i: 節點 i 是否為 (孤島的) 根；實際根節點固定為 1
+    w_lb = np.zeros(N); w_lb[net.root_pos] = 1.0
+    w = model.addMVar(N, lb=w_lb, vtype=GRB.BINARY, name=f"w_root{sfx}")
+
+    if method == "flow":
+        f = model.addMVar(L, lb=-(N - 1), ub=N - 1, name=f"f_tree{sfx}")
+        g = model.addMVar(N, lb=0.0, ub=N, name=f"g_tree{sfx}")
+        model.addConstr(net.incidence @ f + g == np.ones(N), name=f"Tree_Flow{sfx}")
+        model.addConstr(f <= (N - 1) * v, name=f"Tree_Cap_Ub{sfx}")
+        model.addConstr(f >= -(N - 1) * v, name=f"Tree_Cap_Lb{sfx}")
+        model.addConstr(g <= N * w, name=f"Tree_Source{sfx}")
+        model.addConstr(v.sum() + w.sum() == N, name=f"Tree_Edges{sfx}")
+        return [w]
+
+    if method == "parent":
+        # beta_fwd: from -> to 為父子關係 (from 為 to 的父節點)；beta_bwd 反之
+        b_fwd = model.addMVar(L, vtype=GRB.BINARY, name=f"beta_fwd{sfx}")
+        b_bwd = model.addMVar(L, vtype=GRB.BINARY, name=f"beta_bwd{sfx}")
+        model.addConstr(b_fwd + b_bwd == v, name=f"Parent_Dir{sfx}")
+        # 每個節點恰有一個父節點: 流入方向的線路 (fwd 指向 to、bwd 指向 from) 或虛擬根
+        to_m = sp.csr_matrix((np.ones(L), (net.to_pos, np.arange(L))), shape=(N, L))
+        from_m = sp.csr_matrix((np.ones(L), (net.from_pos, np.arange(L))), shape=(N, L))
+        model.addConstr(to_m @ b_fwd + from_m @ b_bwd + w == np.ones(N), name=f"One_Parent{sfx}")
+        # 深度 (MTZ): 子節點深度至少比父節點多 1
+        d = model.addMVar(N, lb=0.0, ub=N - 1, name=f"depth{sfx}")
+        model.addConstr(d[net.to_pos] - d[net.from_pos] >= 1 - N * (1 - b_fwd), name=f"Depth_Fwd{sfx}")
+        model.addConstr(d[net.from_pos] - d[net.to_pos] >= 1 - N * (1 - b_bwd), name=f"Depth_Bwd{sfx}")
+        return [w, b_fwd, b_bwd]
+
+    raise ValueError(f"未知的輻射狀限制: {method} (可用: {', '.join(RADIALITY_METHODS)})")
+
+# ==========================================
+# Lazy loop-elimination cuts
+# ==========================================
+def find_cycles(net, closed):
+    """ closed: 閉合線路位置；回傳 (以線路位置表示的) 迴路清單，每條多餘的線路對應一個迴路 """
+    parent = list(range(net.n_nodes))
+    adj = [[] for _ in range(net.n_nodes)]
+
+    def root(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def path(a, b):
+        """ 目前森林中 a 到 b 的路徑 (線路位置) """
+        prev = {a: None}
+        queue = [a]
+        while queue and b not in prev:
+            nxt = []
+            for u in queue:
+                for w, k in adj[u]:
+                    if w not in prev:
+                        prev[w] = (u, k)
+                        nxt.append(w)
+            queue = nxt
+        out = []
+        while prev[b] is not None:
+            b, k = prev[b]
+            out.append(k)
+        return out
+
+    cycles = []
+    for k in closed:
+        a, b = net.from_pos[k], net.to_pos[k]
+        ra, rb = root(a), root(b)
+        if ra == rb:
+            cycles.append(path(a, b) + [k])
+            continue
+        parent[ra] = rb
+        adj[a].append((b, k))
+        adj[b].append((a, k))
+    return cycles
+
+def _loop_callback(model, where):
+    if where != GRB.Callback.MIPSOL:
+        return
+    for net, v in model._loop_blocks:
+        closed = np.flatnonzero(model.cbGetSolution(v) > 0.5)
+        for cycle in find_cycles(net, closed):
+            model.cbLazy(v[np.array(cycle)].sum() <= len(cycle) - 1)
+
+def optimize(model, callback=None):
+    """ model.optimize()；若有 lazy 輻射狀限制則掛上 callback (callback 為額外的 Gurobi callback，兩者可並存) """
+    lazy = bool(getattr(model, "_loop_blocks", None))
+    if lazy and callback is not None:
+        def both(m, where):
+            _loop_callback(m, where)
+            callback(m, where)
+        model.optimize(both)
+    elif lazy or callback is not None:
+        model.optimize(_loop_callback if lazy else callback)
+    else:
+        model.optimize()
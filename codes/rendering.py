@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+繪圖輸出 (Headless Rendering Pipeline)
+
+plt.show() 在沒有螢幕的批次主機上會卡住整個流程，因此所有圖表改由這裡輸出:
+  * PLOT_MODE = "file" (預設): 非互動的 Agg 後端，存成 FIGURE_DIR 下的 PNG / SVG 檔
+  * PLOT_MODE = "show"      : 原本的互動視窗 (會阻塞到視窗關閉)
+  * PLOT_MODE = "off"       : 完全不畫 (plotting_enabled() 為 False，呼叫端可略過整段繪圖)
+預設值可由環境變數 PLOT_MODE / FIGURE_DIR / FIGURE_FORMATS (例如 "png,svg") 指定，或呼叫 set_plot_mode()
+
+Renderer 可把繪圖工作丟到背景的 process pool，求解繼續進行；繪圖函式必須可被 pickle
+(模組層級的函式，參數為 DataFrame、dict 等資料)。沒有 if __name__ == "__main__" 保護的腳本
+在 spawn 時會被重新執行，這類腳本請使用 max_workers=0 (在目前的 process 中繪圖)
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+
+PLOT_MODES = ("file", "show", "off")
+PLOT_MODE = os.environ.get("PLOT_MODE", "file")
+FIGURE_DIR = os.environ.get("FIGURE_DIR", "figures")
+FIGURE_FORMATS = tuple(os.environ.get("FIGURE_FORMATS", "png").split(","))
+FIGURE_DPI = 100
+
+def set_plot_mode(mode, out_dir=None, formats=None):
+    global PLOT_MODE, FIGURE_DIR, FIGURE_FORMATS
+    if mode not in PLOT_MODES:
+        raise ValueError(f"未知的繪圖模式: {mode} (可用: {', '.join(PLOT_MODES)})")
+    PLOT_MODE = mode
+    if out_dir is not None: FIGURE_DIR = out_dir
+    if formats is not None: FIGURE_FORMATS = tuple(formats)
+    if mode != "show":
+        plt.switch_backend("Agg")
+
+if PLOT_MODE not in PLOT_MODES:
+    raise ValueError(f"未知的 PLOT_MODE: {PLOT_MODE} (可用: {', '.join(PLOT_MODES)})")
+if PLOT_MODE != "show":
+    plt.switch_backend("Agg")
+
+def plotting_enabled():
+    return PLOT_MODE != "off"
+
+def finish_figure(name, fig=None):
+    """ 取代 plt.show(): 依模式存檔 / 顯示 / 丟棄目前的圖，回傳寫出的檔案路徑 """
+    fig = fig or plt.gcf()
+    paths = []
+    if PLOT_MODE == "show":
+        plt.show()
+        return paths
+    if PLOT_MODE == "file":
+        os.makedirs(FIGURE_DIR, exist_ok=True)
+        for fmt in FIGURE_FORMATS:
+            path = os.path.join(FIGURE_DIR, f"{name}.{fmt}")
+            fig.savefig(path, dpi=FIGURE_DPI)
+            paths.append(path)
+    plt.close(fig)
+    return paths
+
+# ==========================================
+# 背景繪圖
+# ==========================================
+def _init_worker(out_dir, formats):
+    set_plot_mode("file", out_dir, formats)
+
+def _render(fn, name, args, kwargs):
+    fn(*args, **kwargs)
+    return finish_figure(name)
+
+
+class Renderer:
+    """
+    submit(fn, *args, name=...): fn 畫出目前的圖 (不呼叫 show / savefig)，由 Renderer 依模式輸出
+    max_workers > 0 且為 "file" 模式時在背景 process 中繪圖；wait() 等待全部完成並回傳檔案路徑
+    """
+
+    def __init__(self, max_workers=0):
+        self.pool = None
+        self.futures = []
+        self.paths = []
+        if max_workers > 0 and PLOT_MODE == "file":
+            ctx = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=_init_worker,
+                                            initargs=(FIGURE_DIR, FIGURE_FORMATS))
+
+    def submit(self, fn, *args, name, **kwargs):
+        if not plotting_enabled():
+            return
+        if self.pool is not None:
+            self.futures.append(self.pool.submit(_render, fn, name, args, kwargs))
+        else:
+            self.paths.extend(_render(fn, name, args, kwargs))
+
+    def wait(self):
+        for fut in self.futures:
+            self.paths.extend(fut.result())
+        self.futures = []
+        return self.paths
+
+    def close(self):
+        self.wait()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+樣本平均近似 (Sample Average Approximation, SAA)
+
+兩個情境的模型無法看出方案品質對情境集合的敏感度。SAA 的流程:
+  1. 從情境母體 (dict 或 ScenarioStore) 抽 M 組、每組 N 個情境 (機率 1/N，相同攻擊集合合併)，
+     各自以 solve_robust_model 求解 (平行)。最佳值的平均是真實最佳值的統計下界 (期望值意義下)
+  2. 每個候選方案在另一組 N' 個樣本外情境上以 RadialRecourse 評估 (平行)，得到上界估計
+  3. 樣本外成本最低的方案為建議方案；optimality gap = 上界 - 下界，並附上信賴區間
+     (下界用 t 分布、上界用常態近似，兩者的半寬相加，較保守)
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from distflow import ieee13_network
+import instrumentation
+import planning
+from planning import DEFAULT_PARAMS, solve_robust_model, configure_worker
+from radial_recourse import RadialRecourse
+from scenario_reduction import dedupe_scenarios
+from scenario_store import ScenarioStore
+
+# ==========================================
+# 1. 抽樣
+# ==========================================
+def _population(source):
+    """ 情境母體 -> (攻擊集合清單, 正規化後的機率) """
+    if isinstance(source, ScenarioStore):
+        attacks = [source.decode(i) for i in range(len(source))]
+        probs = source.probs.copy()
+    else:
+        attacks = [list(sc['attack']) for sc in source.values()]
+        probs = np.array([sc['prob'] for sc in source.values()], dtype=float)
+    return attacks, probs / probs.sum()
+
+def sample_scenarios(attacks, probs, n, rng, prefix="S"):
+    """ 依機率抽 n 個情境 (可重複)，每個機率 1/n；相同的攻擊集合合併 """
+    picks = rng.choice(len(attacks), size=n, p=probs)
+    drawn = {f"{prefix}{k + 1}": {'prob': 1.0 / n, 'attack': attacks[i]} for k, i in enumerate(picks)}
+    return dedupe_scenarios(drawn)[0]
+
+# ==========================================
+# 2. 平行工作
+# ==========================================
+def _solve_replication(args):
+    m, scenarios, net, params = args
+    return solve_robust_model(f"SAA_{m}", scenarios, net, params)
+
+def _evaluate_plan(args):
+    """ 回傳 (期望總成本, 單一樣本成本的標準差)；合併後情境的機率即為其在 n 個樣本中的權重 """
+    hardened, dgs, scenarios, n, net, params = args
+    q = RadialRecourse(net, params).scenario_costs(hardened, dgs, scenarios)
+    w = np.array([sc['prob'] for sc in scenarios.values()])
+    mean = float(w @ q)
+    var = float(w @ (q - mean) ** 2) * n / max(1, n - 1)
+    return params.invest_cost(len(hardened), len(dgs)) + mean, float(np.sqrt(var))
+
+def _map(fn, tasks, max_workers, threads_per_worker):
+    if max_workers == 1:
+        return [fn(t) for t in tasks]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=configure_worker,
+                             initargs=(threads_per_worker, planning.SOLVER_BACKEND, instrumentation.worker_state())) as pool:
+        return list(pool.map(fn, tasks))
+
+# ==========================================
+# 3. 主流程
+# ==========================================
+def run_saa(source, n_samples, n_replications, n_eval, net=None, params=DEFAULT_PARAMS, seed=0,
+            alpha=0.05, max_workers=1, threads_per_worker=1):
+    """
+    source: 情境母體 ({名稱: {'prob', 'attack'}} 或 ScenarioStore)
+    n_samples (N): 每組樣本的情境數；n_replications (M): 樣本組數；n_eval (N'): 樣本外情境數
+    回傳 (summary, table)
+      summary: 下界 / 上界 / gap 的估計值與 1 - alpha 信賴區間，以及建議方案
+      table: 每組樣本一列 (SAA 最佳值、方案、樣本外成本與標準差)
+    """
+    if net is None: net = ieee13_network()
+    if n_replications < 2:
+        raise ValueError("至少需要 2 組樣本才能估計下界的變異數")
+    attacks, probs = _population(source)
+    rng = np.random.default_rng(seed)
+
+    # 1. M 組 SAA 問題
+    samples = [sample_scenarios(attacks, probs, n_samples, rng) for _ in range(n_replications)]
+    solved = _map(_solve_replication, [(m, sc, net, params) for m, sc in enumerate(samples)],
+                  max_workers, threads_per_worker)
+    if any(res is None for res in solved):
+        raise RuntimeError("部分 SAA 問題求解失敗")
+
+    # 2. 候選方案的樣本外評估 (相同方案只評估一次)
+    oos = sample_scenarios(attacks, probs, n_eval, rng, prefix="E")
+    keys = [(tuple(sorted(r['Hardened'])), tuple(sorted(r['New DGs']))) for r in solved]
+    plans = list(dict.fromkeys(keys))
+    evaluated = _map(_evaluate_plan, [(list(h), list(g), oos, n_eval, net, params) for h, g in plans],
+                     max_workers, threads_per_worker)
+    upper = dict(zip(plans, evaluated))
+
+    table = pd.DataFrame([{
+        "Replication": m, "SAA Obj": res['Obj Value'],
+        "Hardened": res['Hardened'], "New DGs": res['New DGs'],
+        "OOS Cost": round(upper[key][0], 2), "OOS Std": round(upper[key][1], 2),
+    } for m, (res, key) in enumerate(zip(solved, keys))])
+
+    # 3. 統計界
+    v = table["SAA Obj"].to_numpy(dtype=float)
+    lower = float(v.mean())
+    lower_hw = float(stats.t.ppf(1 - alpha / 2, n_replications - 1) * v.std(ddof=1) / np.sqrt(n_replications))
+    best = min(plans, key=lambda k: upper[k][0])
+    ub, ub_std = upper[best]
+    upper_hw = float(stats.norm.ppf(1 - alpha / 2) * ub_std / np.sqrt(n_eval))
+    gap = ub - lower
+
+    summary = {
+        "Hardened": list(best[0]), "New DGs": list(best[1]),
+        "Lower Bound": round(lower, 2), "Lower CI": (round(lower - lower_hw, 2), round(lower + lower_hw, 2)),
+        "Upper Bound": round(ub, 2), "Upper CI": (round(ub - upper_hw, 2), round(ub + upper_hw, 2)),
+        "Gap": round(gap, 2), "Gap CI": (round(gap - lower_hw - upper_hw, 2), round(gap + lower_hw + upper_hw, 2)),
+        "N": n_samples, "M": n_replications, "N_eval": n_eval, "Distinct Plans": len(plans),
+    }
+    return summary, table
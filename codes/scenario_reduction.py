@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+情境縮減 (Scenario Reduction)
+
+颱風模型抽樣出的攻擊情境動輒上萬筆，Extensive Form 無法全部放入。流程:
+  1. 去重: 攻擊集合相同 (排序後的 tuple，與 generate_attack_legend 相同的寫法) 的情境合併，機率相加
+  2. 距離: 兩個情境在一組參考方案下第二階段成本的最大差 d(i, j) = max_x |Q_i(x) - Q_j(x)|
+     (metric="hamming" 時改用攻擊線路的對稱差數量，不需求解)
+  3. 選取: forward selection (Heitsch-Römisch 的 fast forward selection) 或 k-medoids
+  4. 重新分配: 每個被刪除的情境把機率交給最近的保留情境
+縮減誤差為 Kantorovich 距離 sum_i p_i * min_j d(i, j)；metric="recourse" 時，
+它是任一參考方案的期望第二階段成本在縮減前後的差的上界
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from distflow import ieee13_network
+from planning import DEFAULT_PARAMS, canonical_attack
+from radial_recourse import RadialRecourse
+
+REDUCTION_METHODS = ("forward", "kmedoids")
+REDUCTION_METRICS = ("recourse", "hamming")
+
+
+@dataclass
+class ReductionResult:
+    scenarios: dict   # 縮減後的情境 (保留原本的名稱，機率已重新分配)
+    error: float      # 縮減誤差 (Kantorovich 距離)
+    assignment: dict  # 原情境名稱 -> 代表它的保留情境名稱
+    n_input: int      # 原始情境數
+    n_unique: int     # 去重後的情境數
+
+
+def dedupe_scenarios(scenarios):
+    """
+    合併攻擊集合相同的情境，回傳 (unique, members)
+    unique 以每組第一個情境的名稱為鍵；members[鍵] 為併入該組的所有原情境名稱
+    """
+    unique, members, first = {}, {}, {}
+    for s, sc in scenarios.items():
+        atk = canonical_attack(sc['attack'])
+        if atk in first:
+            key = first[atk]
+            unique[key]['prob'] += sc['prob']
+            members[key].append(s)
+        else:
+            first[atk] = s
+            unique[s] = {'prob': float(sc['prob']), 'attack': list(atk)}
+            members[s] = [s]
+    return unique, members
+
+def default_reference_plans(net, params=DEFAULT_PARAMS):
+    """ 不投資、只強化一條線、只蓋一台發電機的所有方案 (預算為 0 的項目略過) """
+    plans = [([], [])]
+    if params.Budget_H > 0:
+        plans += [([l], []) for l in net.line_ids]
+    if params.Budget_G > 0:
+        plans += [([], [g]) for g in net.candidate_nodes]
+    return plans
+
+def recourse_cost_matrix(scenarios, plans, net=None, params=DEFAULT_PARAMS, evaluator=None):
+    """ 回傳 (情境數 x 方案數) 的第二階段成本 Q_s(x) """
+    if net is None: net = ieee13_network()
+    if evaluator is None:
+        evaluator = RadialRecourse(net, params)
+    Q = np.empty((len(scenarios), len(plans)))
+    for j, (hardened, dgs) in enumerate(plans):
+        Q[:, j] = evaluator.scenario_costs(hardened, dgs, scenarios)
+    return Q
+
+# ==========================================
+# 距離與選取
+# ==========================================
+def _distance_block(X, rows, cols, metric):
+    """ d(rows, cols)；X 為成本矩陣 (recourse) 或攻擊遮罩 (hamming) """
+    A, B = X[rows][:, None, :], X[cols][None, :, :]
+    if metric == "recourse":
+        return np.abs(A - B).max(axis=2)
+    return (A != B).sum(axis=2).astype(float)
+
+def forward_selection(X, probs, n_keep, metric, block_size=1 << 22):
+    """
+    每一步加入使 Kantorovich 距離下降最多的情境；回傳保留情境的索引 (依選入順序)
+    距離矩陣不整個存下，每次只計算 block_size 個元素左右的欄區塊
+    """
+    n = len(probs)
+    chunk = max(1, block_size // (n * X.shape[1]))
+    rows = np.arange(n)
+    d_min = np.full(n, np.inf)
+    selected = []
+    for _ in range(min(n_keep, n)):
+        best, best_cost = -1, np.inf
+        for start in range(0, n, chunk):
+            cols = rows[start:start + chunk]
+            cost = probs @ np.minimum(d_min[:, None], _distance_block(X, rows, cols, metric))
+            cost[np.isin(cols, selected)] = np.inf
+            k = int(np.argmin(cost))
+            if cost[k] < best_cost:
+                best, best_cost = int(cols[k]), cost[k]
+        selected.append(best)
+        d_min = np.minimum(d_min, _distance_block(X, rows, [best], metric)[:, 0])
+    return selected
+
+def k_medoids(X, probs, medoids, metric, max_iter=100, block_size=1 << 22):
+    """
+    由初始 medoids 交替「指派到最近的 medoid」與「群內重選 medoid」直到不再改變
+    與 forward_selection 相同，距離每次只計算 block_size 個元素左右的區塊
+    """
+    medoids = list(medoids)
+    n = len(probs)
+    rows = np.arange(n)
+    for _ in range(max_iter):
+        labels = np.empty(n, dtype=int)
+        chunk = max(1, block_size // (len(medoids) * X.shape[1]))
+        for start in range(0, n, chunk):
+            part = rows[start:start + chunk]
+            labels[part] = np.argmin(_distance_block(X, part, medoids, metric), axis=1)
+        changed = False
+        for c in range(len(medoids)):
+            members = rows[labels == c]
+            if len(members) == 0:
+                continue
+            chunk = max(1, block_size // (len(members) * X.shape[1]))
+            within = np.concatenate([probs[members] @ _distance_block(X, members, members[start:start + chunk], metric)
+                                     for start in range(0, len(members), chunk)])
+            m = int(members[np.argmin(within)])
+            if m != medoids[c]:
+                medoids[c], changed = m, True
+        if not changed:
+            break
+    return medoids
+
+# ==========================================
+# 主流程
+# ==========================================
+def reduce_scenarios(scenarios, n_keep, method="forward", metric="recourse", net=None, params=DEFAULT_PARAMS,
+                     plans=None, evaluator=None):
+    """
+    scenarios: 與 solve_robust_model 相同格式 ({名稱: {'prob', 'attack'}})
+    n_keep: 保留的情境數；plans: 計算 recourse 距離的參考方案 (預設 default_reference_plans)
+    回傳 ReductionResult；縮減後的機率總和與原本相同
+    """
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"未知的縮減方法: {method} (可用: {', '.join(REDUCTION_METHODS)})")
+    if metric not in REDUCTION_METRICS:
+        raise ValueError(f"未知的距離: {metric} (可用: {', '.join(REDUCTION_METRICS)})")
+    if n_keep < 1:
+        raise ValueError("n_keep 至少為 1")
+    if net is None: net = ieee13_network()
+
+    unique, members = dedupe_scenarios(scenarios)
+    keys = list(unique.keys())
+    probs = np.array([unique[s]['prob'] for s in keys])
+
+    if n_keep >= len(keys):
+        selected = list(range(len(keys)))
+        labels = np.arange(len(keys))
+        error = 0.0
+    else:
+        if metric == "recourse":
+            if plans is None: plans = default_reference_plans(net, params)
+            X = recourse_cost_matrix(unique, plans, net, params, evaluator)
+        else:
+            X = np.zeros((len(keys), net.n_lines), dtype=bool)
+            for i, s in enumerate(keys):
+                X[i, net.line_positions(unique[s]['attack'])] = True
+
+        selected = forward_selection(X, probs, n_keep, metric)
+        if method == "kmedoids":
+            selected = k_medoids(X, probs, selected, metric)
+        d = _distance_block(X, np.arange(len(keys)), selected, metric)
+        labels = np.argmin(d, axis=1)
+        error = float(probs @ d[np.arange(len(keys)), labels])
+
+    reduced = {keys[k]: {'prob': 0.0, 'attack': unique[keys[k]]['attack']} for k in selected}
+    assignment = {}
+    for i, s in enumerate(keys):
+        target = keys[selected[labels[i]]]
+        reduced[target]['prob'] += unique[s]['prob']
+        for orig in members[s]:
+            assignment[orig] = target
+    return ReductionResult(reduced, error, assignment, len(scenarios), len(keys))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+串流情境讀取 (Streaming Scenario Store)
+
+蒙地卡羅模擬輸出的攻擊情境可達百萬筆，不適合寫成 dict 常數。這裡以 generator 逐列讀取:
+  * CSV    : 欄位 attack (以 ; 或空白分隔的線路 ID，可為空) 與 prob；選用欄位 name
+  * JSONL  : 每列 {"attack": [...], "prob": p, "name": 選用}
+  * Parquet: 欄位同 CSV，attack 可為整數 list 或字串 (需要 pyarrow)
+讀入時立即正規化 (排序、去除重複線路) 並合併攻擊集合相同的情境 (機率相加)。
+每個不同的攻擊集合只存一列 bitset (每條線路 1 bit，np.packbits) 與一個機率，
+記憶體只隨「不同的攻擊集合」數量成長，與抽樣筆數無關
+"""
+import csv
+import json
+import os
+import re
+
+import numpy as np
+
+from planning import canonical_attack
+
+# ==========================================
+# 1. 檔案讀取 (generator，每次一列)
+# ==========================================
+def _parse_attack(value):
+    """ 字串 "2;5;8" / "2 5 8" / "[2, 5, 8]" 或整數序列 -> list[int] """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [int(tok) for tok in re.split(r"[;,\s\[\]]+", value) if tok]
+    return [int(l) for l in value]
+
+def _parse_name(value):
+    """ 空白的名稱 (CSV 的空欄位、"" 或 null) 視為未命名，由 ScenarioStore 自動命名 """
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value is None or value == "" else value
+
+def iter_csv(path):
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            yield _parse_name(row.get("name")), _parse_attack(row["attack"]), float(row["prob"])
+
+def iter_jsonl(path):
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                rec = json.loads(line)
+                yield _parse_name(rec.get("name")), _parse_attack(rec["attack"]), float(rec["prob"])
+
+def iter_parquet(path, batch_size=65536):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("讀取 Parquet 需要 pyarrow (pip install pyarrow)") from e
+    pf = pq.ParquetFile(path)
+    for batch in pf.iter_batches(batch_size=batch_size):
+        cols = batch.to_pydict()
+        names = cols.get("name", [None] * batch.num_rows)
+        for name, atk, prob in zip(names, cols["attack"], cols["prob"]):
+            yield _parse_name(name), _parse_attack(atk), float(prob)
+
+READERS = {".csv": iter_csv, ".jsonl": iter_jsonl, ".parquet": iter_parquet}
+
+def iter_scenario_file(path, fmt=None):
+    """ 依副檔名 (或 fmt) 選擇讀取器，逐列產生 (name, attack, prob)；name 可能為 None """
+    fmt = fmt or os.path.splitext(path)[1].lower()
+    if not fmt.startswith("."):
+        fmt = "." + fmt
+    if fmt not in READERS:
+        raise ValueError(f"不支援的情境檔案格式: {fmt} (可用: {', '.join(READERS)})")
+    return READERS[fmt](path)
+
+# ==========================================
+# 2. 情境庫 (bitset)
+# ==========================================
+class ScenarioStore:
+    """
+    以 bitset 儲存、依攻擊集合去重的情境集合
+    masks[i] 為第 i 個攻擊集合的 packed bitset (位元順序同 line_ids)，probs[i] 為其累計機率
+    """
+
+    def __init__(self, line_ids, capacity=1024):
+        self.line_ids = [int(l) for l in line_ids]
+        self._pos = {l: k for k, l in enumerate(self.line_ids)}
+        self.n_bytes = (len(self.line_ids) + 7) // 8
+        self._masks = np.zeros((capacity, self.n_bytes), dtype=np.uint8)
+        self._probs = np.zeros(capacity)
+        self._names = []
+        self._used = set()
+        self._auto = {}    # 自動命名的情境名稱 -> 列號 (名稱被之後明確指定的情境使用時改名)
+        self._index = {}   # 整數 bitset -> 列號
+        self.n_rows = 0    # 讀入的原始筆數 (去重前)
+
+    @classmethod
+    def from_file(cls, path, line_ids, fmt=None):
+        store = cls(line_ids)
+        store.extend(iter_scenario_file(path, fmt))
+        return store
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def masks(self):
+        return self._masks[:len(self)]
+
+    @property
+    def probs(self):
+        return self._probs[:len(self)]
+
+    def _grow(self):
+        n = len(self._probs)
+        self._masks = np.concatenate([self._masks, np.zeros((n, self.n_bytes), dtype=np.uint8)])
+        self._probs = np.concatenate([self._probs, np.zeros(n)])
+
+    def bit_key(self, attack):
+        """ 攻擊線路 -> 以整數表示的 bitset (第 k 位代表 line_ids[k])；線路 ID 不存在時丟出 ValueError """
+        key = 0
+        try:
+            for l in attack:
+                key |= 1 << self._pos[int(l)]
+        except KeyError as e:
+            raise ValueError(f"攻擊情境中有不存在的線路: {e.args[0]}") from None
+        return key
+
+    def encode(self, attack):
+        """ 攻擊線路 -> packed bitset (np.packbits 的位元順序) """
+        bits = np.zeros(len(self.line_ids), dtype=np.uint8)
+        bits[[self._pos[l] for l in canonical_attack(attack)]] = 1
+        return np.packbits(bits)
+
+    def decode(self, i):
+        """ 第 i 個攻擊集合 (排序後的線路 ID) """
+        bits = np.unpackbits(self._masks[i], count=len(self.line_ids))
+        return [self.line_ids[k] for k in np.flatnonzero(bits)]
+
+    def add(self, attack, prob, name=None):
+        """ 加入一筆情境，回傳其攻擊集合的列號 (與既有情境相同時只累加機率) """
+        key = self.bit_key(attack)  # 重複、順序不同的攻擊線路得到相同的鍵
+        self.n_rows += 1
+        i = self._index.get(key)
+        if i is None:
+            i = len(self)
+            if name is None:
+                name = self._free_name(i + 1)
+                self._auto[name] = i
+            elif name in self._auto:
+                # 明確指定的名稱優先: 先前自動產生的同名情境改用其他未使用的名稱
+                j = self._auto.pop(name)
+                fresh = self._free_name(j + 1)
+                self._names[j] = fresh
+                self._auto[fresh] = j
+                self._used.add(fresh)
+            elif name in self._used:
+                raise ValueError(f"情境名稱重複但攻擊集合不同: {name}")
+            if i == len(self._probs):
+                self._grow()
+            self._masks[i] = self.encode(attack)
+            self._index[key] = i
+            self._names.append(name)
+            self._used.add(name)
+        self._probs[i] += prob
+        return i
+
+    def _free_name(self, n):
+        """ 從 S{n} 開始第一個未被使用的名稱 """
+        while f"S{n}" in self._used:
+            n += 1
+        return f"S{n}"
+
+    def extend(self, rows):
+        """ rows: 可迭代的 (name, attack, prob)，例如 iter_scenario_file 的輸出 """
+        for name, attack, prob in rows:
+            self.add(attack, prob, name)
+        return self
+
+    def attack_counts(self):
+        """ 每個攻擊集合的線路數 """
+        return np.unpackbits(self.masks, axis=1, count=len(self.line_ids)).sum(axis=1)
+
+    def iter_scenarios(self):
+        """ 逐一產生 (name, {'prob', 'attack'}) """
+        for i, name in enumerate(self._names):
+            yield name, {'prob': float(self._probs[i]), 'attack': self.decode(i)}
+
+    def to_scenarios(self):
+        """ 與 solve_robust_model 相同格式的 dict (情境很多時建議先以 scenario_reduction 縮減) """
+        return dict(self.iter_scenarios())
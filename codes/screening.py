@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+孤島感知的圖論篩選 (Islanding-Aware Graph Screening)
+
+固定投資方案後，許多情境的第二階段成本可以直接由連通性讀出:
+拆掉「被攻擊且未強化」的線路後，
+  * 含根節點的元件: 所有負載都可供電 (由變電站與元件內的 DG 供應)
+  * 不含根節點、沒有 DG 的孤島: 負載全部停電，不需閉合任何線路
+  * 有 DG 的孤島: DG 總容量足以供應全島負載時全部供電；總容量不足時需決定供電範圍，改解 MILP
+閉合線路的數量則是把所有「需要供電的節點」接到某個電源 (變電站或 DG) 的最小 Steiner 森林 (零負載節點可不接)，
+每個選入的電源各自為一棵樹的根 (以 DG 為根的樹，負載超過單台 DG 容量時不通過下面的潮流檢查)。
+當停電懲罰遠大於開關懲罰、且所選的森林通過潮流 (容量、電壓) 檢查時，此結果即為第二階段 MILP 的最佳值；
+無法證明時回傳 None，由呼叫端改解 MILP
+"""
+from dataclasses import dataclass
+from itertools import combinations
+
+import numpy as np
+
+from distflow import V_MIN_SQ, V_MAX_SQ, line_flow_bounds
+
+
+@dataclass
+class ScreenResult:
+    cost: float      # 第二階段成本 (停電 + 開關)
+    shed_kW: float   # 總停電量
+    closed: list     # 閉合的線路 (ID)
+
+
+class GraphScreen:
+    """ max_steiner: 每個元件中可列舉的零負載節點數上限 (2^k 種組合)，超過時放棄篩選 """
+
+    def __init__(self, net, params, max_steiner=10, tol=1e-9):
+        self.net = net
+        self.params = params
+        self.max_steiner = max_steiner
+        self.tol = tol
+        self.dg_cap_pu = params.dg_cap_pu(net)
+        self.P_lb, self.P_ub, _, _ = line_flow_bounds(net, net.candidate_nodes, self.dg_cap_pu)
+
+        # 停電懲罰必須大於接上任一負載所需的開關懲罰，「全部供電」才必定是最佳
+        load = net.P_load_pu
+        zero = int(np.sum(load <= tol)) - int(load[net.root_pos] <= tol)
+        positive = load[load > tol]
+        self.valid = (len(positive) == 0 or
+                      params.Cost_Shedding * net.S_base * positive.min() > params.Cost_Switching * (zero + 1))
+
+    def screen(self, attack, hardened, dgs):
+        """ 回傳 ScreenResult；無法證明最佳時回傳 None """
+        if not self.valid:
+            return None
+        net = self.net
+        hardened = set(hardened)
+        down = set(net.line_positions([l for l in attack if l not in hardened]))
+        avail = [k for k in range(net.n_lines) if k not in down]
+        dg_pos = set(net.node_positions(list(dgs)).tolist()) if len(dgs) else set()
+
+        adj = {u: [] for u in range(net.n_nodes)}
+        for k in avail:
+            a, b = net.from_pos[k], net.to_pos[k]
+            adj[a].append((b, k)); adj[b].append((a, k))
+
+        shed, closed = 0.0, []
+        for comp in self._components(adj):
+            load = net.P_load_pu[comp].sum()
+            sources = sorted((u for u in comp if u in dg_pos or u == net.root_pos), key=lambda u: u != net.root_pos)
+            if load <= self.tol:
+                continue
+            if not sources:
+                shed += load  # 無 DG 的孤島全部停電
+                continue
+            if net.root_pos not in comp and len(sources) * self.dg_cap_pu < load - self.tol:
+                return None  # DG 不足以供應全島: 需決定供電範圍，交給 MILP
+            forest = self._steiner_forest(comp, adj, sources)
+            if forest is None:
+                return None
+            edges, parent = forest
+            if not self._power_flow_ok(parent):
+                return None
+            closed.extend(edges)
+
+        p = self.params
+        cost = p.Cost_Shedding * net.S_base * shed + p.Cost_Switching * len(closed)
+        return ScreenResult(cost, shed * net.S_base, [net.line_ids[k] for k in sorted(closed)])
+
+    # ------------------------------------------
+    def _components(self, adj):
+        seen = np.zeros(self.net.n_nodes, dtype=bool)
+        for s in range(self.net.n_nodes):
+            if seen[s]:
+                continue
+            comp, stack = [], [s]
+            seen[s] = True
+            while stack:
+                u = stack.pop(); comp.append(u)
+                for w, _ in adj[u]:
+                    if not seen[w]:
+                        seen[w] = True; stack.append(w)
+            yield comp
+
+    def _steiner_forest(self, comp, adj, sources):
+        """
+        以最少線路將元件內所有正負載節點接到某個電源 (變電站或 DG) 的森林:
+        列舉要經過的零負載節點 (含未帶負載的電源)，選入的電源各自為一棵樹的根，
+        線路數 = 節點數 - 樹的數目。回傳 (edges, parent)；零負載節點過多時回傳 None
+        """
+        load = self.net.P_load_pu
+        terminals = {u for u in comp if load[u] > self.tol or u == self.net.root_pos}  # 變電站沒有容量限制，一律納入
+        optional = [u for u in comp if u not in terminals]
+        if len(optional) > self.max_steiner:
+            return None
+        best = None
+        for k in range(len(optional) + 1):
+            for extra in combinations(optional, k):
+                keep = terminals | set(extra)
+                roots = [u for u in sources if u in keep]
+                if not roots or (best is not None and len(keep) - len(roots) >= len(best[0])):
+                    continue
+                # 依序從各電源展開 (變電站優先)，DG 只供應變電站接不到的部分，降低超出 DG 容量的機會
+                parent, edges = {u: None for u in roots}, []
+                for r in roots:
+                    queue = [r]
+                    while queue:
+                        u = queue.pop()
+                        for w, line in adj[u]:
+                            if w in keep and w not in parent:
+                                parent[w] = (u, line); edges.append(line); queue.append(w)
+                if len(parent) == len(keep):
+                    best = (edges, parent)
+        return best
+
+    def _power_flow_ok(self, parent):
+        """
+        在森林上以 LinDistFlow 計算潮流與電壓 (backward / forward sweep)，檢查容量、DG 出力與電壓上下界
+        變電站的樹電壓固定為 1.0；DG 的樹 (孤島) 電壓可自由設定，只需壓降總幅度不超過上下界之差
+        模型中無功削減 delta_Q 不計成本 (且 DG 不提供無功)，因此取 Q = 0: 這是對容量與電壓最寬鬆的選擇
+        """
+        net = self.net
+        order = [u for u, link in parent.items() if link is None]
+        children = {}
+        for w, link in parent.items():
+            if link is not None:
+                children.setdefault(link[0], []).append(w)
+        for u in order:
+            order.extend(children.get(u, []))
+
+        P_sub = {u: net.P_load_pu[u] for u in order}
+        for u in reversed(order):
+            if parent[u] is not None:
+                P_sub[parent[u][0]] += P_sub[u]
+
+        drop, top = {}, {}
+        for u in order:
+            if parent[u] is None:
+                if u != net.root_pos and P_sub[u] > self.dg_cap_pu + self.tol:
+                    return False
+                drop[u], top[u] = 0.0, u
+                continue
+            p, k = parent[u]
+            sign = 1.0 if net.from_pos[k] == p else -1.0  # 線路方向與樹的方向相同時潮流為正
+            if not (self.P_lb[k] - self.tol <= sign * P_sub[u] <= self.P_ub[k] + self.tol):
+                return False
+            drop[u] = drop[p] + 2 * net.R_pu[k] * P_sub[u]
+            top[u] = top[p]
+
+        for u in order:
+            limit = 1.0 - V_MIN_SQ if top[u] == net.root_pos else V_MAX_SQ - V_MIN_SQ
+            if drop[u] > limit + self.tol:
+                return False
+        return True
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+多維敏感度分析 (Multi-Dimensional Sensitivity Engine)
+
+對 PlanningParams 的任意欄位 (Cost_Shedding、Cost_Hard_Line、Cost_DG_kW、Budget_H、Budget_G、DG_Cap_kW ...)
+以網格 (grid_design) 或拉丁超立方 (lhs_design) 取樣，對每個設計點求解 RP (可選 EV 指標):
+  * 結構參數 (STRUCTURAL_FIELDS) 相同的設計點分成一組，每組只建一個 RobustModel，
+    組內依序只更新目標係數並以前一點的解暖啟動；各組在 process pool 中平行求解
+  * 每個點先查 SolveCache (指定 cache_dir 時各 worker 共用磁碟快取)，重跑或擴充設計時不必重算
+輸出 tidy 表 (每個設計點一列) 與二維的轉折面 (tipping_surface: 每格的最佳方案代號與方案改變的邊界)
+"""
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields, replace
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+from distflow import ieee13_network
+import instrumentation
+import planning
+from planning import (DEFAULT_PARAMS, STRUCTURAL_FIELDS, PlanningParams, RobustModel, calculate_ev_metrics,
+                      configure_worker)
+from solve_cache import SolveCache, solve_key, relabel_result
+
+INTEGER_FIELDS = tuple(f.name for f in fields(PlanningParams) if f.type in (int, "int"))
+
+# ==========================================
+# 1. 實驗設計
+# ==========================================
+def _check_fields(names):
+    valid = {f.name for f in fields(PlanningParams)}
+    unknown = [n for n in names if n not in valid]
+    if unknown:
+        raise ValueError(f"PlanningParams 沒有這些欄位: {', '.join(unknown)}")
+
+def grid_design(axes):
+    """ axes: {欄位: 取值清單}；回傳所有組合 (list of dict) """
+    _check_fields(axes)
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+def lhs_design(ranges, n, seed=0):
+    """ ranges: {欄位: (下限, 上限)}；拉丁超立方取 n 點，整數欄位 (預算) 四捨五入 """
+    _check_fields(ranges)
+    names = list(ranges)
+    unit = qmc.LatinHypercube(d=len(names), seed=seed).random(n)
+    lo = np.array([ranges[k][0] for k in names], dtype=float)
+    hi = np.array([ranges[k][1] for k in names], dtype=float)
+    points = qmc.scale(unit, lo, hi) if np.all(hi > lo) else lo + unit * (hi - lo)
+    return [{k: (int(round(x)) if k in INTEGER_FIELDS else float(x)) for k, x in zip(names, row)} for row in points]
+
+# ==========================================
+# 2. 求解 (每組結構參數一個工作)
+# ==========================================
+def _solve_group(args):
+    """ 同一組結構參數的設計點: 共用一個 RobustModel，依序更新成本並暖啟動 """
+    scenarios, net, points, ev, cache_dir = args
+    cache = SolveCache(path=cache_dir)
+    model = None
+    rows = []
+    for point, params in points:
+        if ev:
+            if model is None:
+                model = RobustModel(scenarios, net, params, case_name="Sensitivity")
+            model.set_params(params)
+            res = calculate_ev_metrics("Sensitivity", scenarios, net, params, cache=cache, solver=model)
+        else:
+            key = solve_key("RP", scenarios, net, params)
+            res = cache.get(key)
+            if res is None:
+                if model is None:
+                    model = RobustModel(scenarios, net, params, case_name="Sensitivity")
+                model.set_params(params)
+                res = model.solve("Sensitivity", scenarios)
+                cache.put(key, res)
+            elif res:
+                res = relabel_result(res, "Sensitivity", scenarios)
+        row = dict(point)
+        if res:
+            row.update({
+                "RP": res['Obj Value'], "Invest ($)": res['Invest ($)'],
+                "Hardened": res['Hardened'], "New DGs": res['New DGs'],
+                "Plan": plan_label(res['Hardened'], res['New DGs']),
+            })
+            if ev:
+                row.update({k: res[k] for k in ("WS", "EEV", "EVPI", "VSS")})
+        rows.append(row)
+    return rows
+
+def plan_label(hardened, dgs):
+    return f"H{sorted(hardened)}|G{sorted(dgs)}"
+
+def run_sensitivity(scenarios, design, net=None, base=DEFAULT_PARAMS, ev=False, max_workers=1,
+                    threads_per_worker=1, cache_dir=None, out_path=None):
+    """
+    scenarios: 與 solve_robust_model 相同格式；design: grid_design / lhs_design 的輸出 (list of dict)
+    base: 設計點未指定的欄位沿用的參數；ev=True 時另外計算 WS / EEV / EVPI / VSS
+    回傳 tidy DataFrame (設計點順序)：設計欄位 + RP、Invest ($)、Hardened、New DGs、Plan (+ EV 指標)
+    """
+    if net is None: net = ieee13_network()
+    if design:
+        _check_fields(set().union(*design))
+
+    # 依結構參數分組；組內依設計值排序，使相鄰的點成本接近 (暖啟動較有效)
+    groups = {}
+    for idx, point in enumerate(design):
+        params = replace(base, **point)
+        groups.setdefault(tuple(getattr(params, f) for f in STRUCTURAL_FIELDS), []).append((idx, point, params))
+    tasks, order = [], []
+    for members in groups.values():
+        members.sort(key=lambda m: tuple(sorted(m[1].items())))
+        order.extend(m[0] for m in members)
+        tasks.append((scenarios, net, [(m[1], m[2]) for m in members], ev, cache_dir))
+
+    if max_workers == 1:
+        results = [_solve_group(t) for t in tasks]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=configure_worker,
+                                 initargs=(threads_per_worker, planning.SOLVER_BACKEND,
+                                           instrumentation.worker_state())) as pool:
+            results = list(pool.map(_solve_group, tasks))
+
+    rows = [None] * len(design)
+    for idx, row in zip(order, itertools.chain.from_iterable(results)):
+        rows[idx] = row
+    table = pd.DataFrame(rows)
+    if out_path:
+        table.to_csv(out_path, index=False)
+    return table
+
+# ==========================================
+# 3. 轉折面
+# ==========================================
+def tipping_surface(table, x, y, value="Plan"):
+    """
+    二維設計 (x, y) 上的轉折面，回傳 (grid, boundary, legend)
+      grid: 以 y 為列、x 為欄的方案代號 (A, B, ...)；value 為其他欄位 (例如 "RP") 時為該欄的數值
+      boundary: 與右方或上方相鄰格的方案不同者為 True (方案翻轉的位置)
+      legend: 代號 -> 方案
+    同一 (x, y) 有多個點時 (其他欄位也有變化) 取第一個
+    """
+    plans = list(dict.fromkeys(table["Plan"].dropna()))
+    legend = {_code(k): p for k, p in enumerate(plans)}
+    codes = {p: c for c, p in legend.items()}
+    plan_grid = table.assign(Code=table["Plan"].map(codes)).pivot_table(
+        index=y, columns=x, values="Code", aggfunc="first").sort_index().sort_index(axis=1)
+
+    same_right = plan_grid.eq(plan_grid.shift(-1, axis=1)) | plan_grid.shift(-1, axis=1).isna()
+    same_up = plan_grid.eq(plan_grid.shift(-1, axis=0)) | plan_grid.shift(-1, axis=0).isna()
+    boundary = ~(same_right & same_up)
+
+    grid = plan_grid if value == "Plan" else table.pivot_table(
+        index=y, columns=x, values=value, aggfunc="first").sort_index().sort_index(axis=1)
+    return grid, boundary, legend
+
+def _code(k):
+    """ 0 -> A, 25 -> Z, 26 -> AA ... """
+    out = ""
+    k += 1
+    while k:
+        k, r = divmod(k - 1, 26)
+        out = chr(65 + r) + out
+    return out
+
+def write_surfaces(table, x, y, out_dir, prefix="sensitivity"):
+    """ 將方案代號面、RP 成本面、邊界與代號表寫成 CSV，回傳寫出的檔案路徑 """
+    os.makedirs(out_dir, exist_ok=True)
+    grid, boundary, legend = tipping_surface(table, x, y)
+    cost, _, _ = tipping_surface(table, x, y, value="RP")
+    paths = {
+        "plan": os.path.join(out_dir, f"{prefix}_{x}_{y}_plan.csv"),
+        "cost": os.path.join(out_dir, f"{prefix}_{x}_{y}_rp.csv"),
+        "boundary": os.path.join(out_dir, f"{prefix}_{x}_{y}_boundary.csv"),
+        "legend": os.path.join(out_dir, f"{prefix}_{x}_{y}_legend.csv"),
+    }
+    grid.to_csv(paths["plan"])
+    cost.to_csv(paths["cost"])
+    boundary.to_csv(paths["boundary"])
+    pd.DataFrame({"Code": list(legend), "Plan": list(legend.values())}).to_csv(paths["legend"], index=False)
+    return paths
+
+
+# ==========================================
+# 4. 命令列
+# ==========================================
+def _parse_axis(text):
+    """ "欄位=v1,v2,v3" 或 "欄位=起點:終點:點數" """
+    name, _, values = text.partition("=")
+    if ":" in values:
+        lo, hi, n = values.split(":")
+        grid = np.linspace(float(lo), float(hi), int(n))
+    else:
+        grid = [float(v) for v in values.split(",")]
+    if name in INTEGER_FIELDS:
+        return name, sorted({int(round(v)) for v in grid})
+    return name, [float(v) for v in grid]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from scenario_store import ScenarioStore
+
+    parser = argparse.ArgumentParser(description="Multi-parameter sensitivity of the robust plan")
+    parser.add_argument("--axis", action="append", default=[], metavar="FIELD=v1,v2|lo:hi:n",
+                        help="grid axis over a PlanningParams field (repeatable)")
+    parser.add_argument("--lhs", type=int, default=0, help="Latin-hypercube points over the axis ranges instead of the grid")
+    parser.add_argument("--scenarios", default=None, help="scenario file (CSV / JSONL / Parquet); default: the S1/S2 base case")
+    parser.add_argument("--ev", action="store_true", help="also compute WS / EEV / EVPI / VSS")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--out-dir", default="sensitivity_out")
+    args = parser.parse_args()
+
+    net = ieee13_network()
+    if args.scenarios:
+        scens = ScenarioStore.from_file(args.scenarios, net.line_ids).to_scenarios()
+    else:
+        scens = {'S1': {'prob': 0.5, 'attack': [2, 11]}, 'S2': {'prob': 0.5, 'attack': [2, 5, 8, 14, 15]}}
+    axes = dict(_parse_axis(a) for a in args.axis)
+    if args.lhs:
+        design = lhs_design({k: (min(v), max(v)) for k, v in axes.items()}, args.lhs)
+    else:
+        design = grid_design(axes)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    table = run_sensitivity(scens, design, net, ev=args.ev, max_workers=args.workers, cache_dir=args.cache_dir,
+                            out_path=os.path.join(args.out_dir, "sensitivity.csv"))
+    names = list(axes)
+    if not args.lhs:
+        for x, y in itertools.combinations(names, 2):
+            write_surfaces(table, x, y, args.out_dir)
+    print(table.to_string(index=False))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+求解結果的向量化讀取 (Vectorized Solution Extraction)
+
+逐一讀取每個區塊的 v.X、P_flow.X ... 在情境多、饋線大時是可觀的開銷。SolutionLayout 在模型建立後
+記下每個變數在模型中的欄位編號 (只做一次)；之後每次求解只以一次 getAttr 取回全部變數值，
+再用索引陣列排成 (線路, 情境)、(節點, 情境) 的 NumPy 陣列 (RobustSolution)。
+強化線路、新增發電機由遮罩直接求得；投資成本、各情境成本也以陣列運算取得，不需 getValue()
+
+對偶值 (duals=True): 變數的 reduced cost 排成相同形狀，另附全部限制式的 Pi；
+只適用於連續模型 (例如 RecourseEvaluator(relax=True)) 與 Gurobi 後端
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from milp_backend import MatrixModel
+
+# 每個區塊中以 (線路, 情境) / (節點, 情境) / (候選節點, 情境) 排列的變數
+LINE_FIELDS = ("v", "P_flow", "Q_flow")
+NODE_FIELDS = ("U", "delta_P", "delta_Q")
+GEN_FIELDS = ("P_gen",)
+
+
+def _columns(mvar):
+    """ MVar 中各變數在模型中的欄位編號 """
+    if hasattr(mvar, "_cols"):  # milp_backend.MatVar
+        return np.asarray(mvar._cols, dtype=int)
+    return np.array([v.index for v in mvar.tolist()], dtype=int)
+
+def _values(model, attr):
+    """ 模型全部變數的 attr (一次呼叫) """
+    if isinstance(model, MatrixModel):
+        if attr != "X":
+            raise ValueError(f"{model.solver} 後端不支援 {attr} (只有 Gurobi 後端提供對偶值)")
+        return model._x
+    return np.asarray(model.getAttr(attr), dtype=float)
+
+
+@dataclass
+class RobustSolution:
+    """ 一次求解的全部數值；情境依 keys 的順序排在第二個維度 """
+    keys: list
+    line_ids: list
+    node_ids: list
+    gen_nodes: list
+    status: int
+    obj: float
+    y_h: np.ndarray      # (線路,)；沒有第一階段變數的模型為 None
+    y_g: np.ndarray      # (候選節點,)
+    v: np.ndarray        # (線路, 情境)
+    P_flow: np.ndarray
+    Q_flow: np.ndarray
+    U: np.ndarray        # (節點, 情境)
+    delta_P: np.ndarray
+    delta_Q: np.ndarray
+    P_gen: np.ndarray    # (候選節點, 情境)
+    rc: dict = None      # duals=True 時: 變數名稱 -> 與上面相同形狀的 reduced cost
+    pi: np.ndarray = None  # duals=True 時: 全部限制式的對偶值 (依模型中的順序)
+
+    @property
+    def hardened_mask(self):
+        return self.y_h > 0.5
+
+    @property
+    def dg_mask(self):
+        return self.y_g > 0.5
+
+    @property
+    def hardened(self):
+        return [self.line_ids[k] for k in np.flatnonzero(self.hardened_mask)]
+
+    @property
+    def new_dgs(self):
+        return [self.gen_nodes[k] for k in np.flatnonzero(self.dg_mask)]
+
+    @property
+    def line_on(self):
+        """ (線路, 情境) 的開關狀態 """
+        return self.v > 0.5
+
+    def shedding_pu(self):
+        """ 各情境的總卸載 (p.u.) """
+        return self.delta_P.sum(axis=0)
+
+    def invest_cost(self, params):
+        return params.invest_cost(int(self.hardened_mask.sum()), int(self.dg_mask.sum()))
+
+    def scenario_costs(self, params, S_base):
+        """ 各情境的第二階段成本 (停電損失 + 開關懲罰)，與 planning.scenario_cost 相同 """
+        return params.Cost_Shedding * S_base * self.shedding_pu() + params.Cost_Switching * self.v.sum(axis=0)
+
+    def column(self, key):
+        """ 單一情境的數值 (dict: 變數名稱 -> 一維陣列) """
+        k = self.keys.index(key)
+        return {f: getattr(self, f)[:, k] for f in LINE_FIELDS + NODE_FIELDS + GEN_FIELDS}
+
+
+class SolutionLayout:
+    """
+    模型的欄位配置: 建立時讀一次各 MVar 的欄位編號，extract() 依此把一次取回的數值排成陣列
+    blocks 與 keys 一一對應；y_h / y_g 可為 None (例如只有第二階段的 RecourseEvaluator)
+    模型新增變數 (例如新增區塊) 後需重新建立
+    """
+
+    def __init__(self, model, net, blocks, keys, y_h=None, y_g=None):
+        model.update()  # 新加入的 Gurobi 變數在 update 之後才有欄位編號
+        blocks = list(blocks)
+        self.keys = list(keys)
+        self.line_ids = list(net.line_ids)
+        self.node_ids = list(net.node_ids)
+        self.gen_nodes = list(blocks[0].gen_nodes) if blocks else []
+        self.y_h = _columns(y_h) if y_h is not None else None
+        self.y_g = _columns(y_g) if y_g is not None else None
+        self.cols = {f: np.column_stack([_columns(getattr(blk, f)) for blk in blocks])
+                     for f in LINE_FIELDS + NODE_FIELDS + GEN_FIELDS}
+
+    def extract(self, model, duals=False):
+        """ 一次取回全部變數值，回傳 RobustSolution；duals=True 時另取 reduced cost 與 Pi """
+        x = _values(model, "X")
+        sol = RobustSolution(
+            keys=self.keys, line_ids=self.line_ids, node_ids=self.node_ids, gen_nodes=self.gen_nodes,
+            status=model.status, obj=model.ObjVal,
+            y_h=x[self.y_h] if self.y_h is not None else None,
+            y_g=x[self.y_g] if self.y_g is not None else None,
+            **{f: x[idx] for f, idx in self.cols.items()},
+        )
+        if duals:
+            if model.IsMIP:
+                raise ValueError("MILP 沒有對偶值；請使用連續模型 (例如 relax=True)")
+            rc = _values(model, "RC")
+            sol.rc = {f: rc[idx] for f, idx in self.cols.items()}
+            if self.y_h is not None:
+                sol.rc.update(y_h=rc[self.y_h], y_g=rc[self.y_g])
+            sol.pi = np.asarray(model.getAttr("Pi"), dtype=float)
+        return sol
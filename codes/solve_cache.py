@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+求解快取 (Content-Addressed Solve Cache)
+
+以 (網路, 攻擊集合, 機率, 成本, 預算) 的內容雜湊作為鍵，記住 solve_robust_model 與
+evaluate_fixed_plan 的結果：
+  * 記憶體內為 LRU，超過 maxsize 時淘汰最久未使用的結果
+  * 指定 path 時，每個結果另存成 <key>.pkl，之後的執行 (或其他 process) 可直接重用
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from dataclasses import astuple
+
+from distflow import ieee13_network
+import planning
+from planning import DEFAULT_PARAMS, canonical_attack, solve_robust_model, evaluate_fixed_plan
+
+
+def canonical_scenarios(scenarios):
+    """ 與情境名稱、順序無關的內容表示: 排序後的 (攻擊線路, 機率) """
+    return tuple(sorted(
+        (canonical_attack(sc['attack']), round(float(sc['prob']), 12)) for sc in scenarios.values()
+    ))
+
+def solve_key(kind, scenarios, net, params, extra=()):
+    """ 不同求解器後端的收斂容差不同，可能得到不同的方案，因此後端名稱也納入鍵 """
+    payload = repr((kind, planning.SOLVER_BACKEND, net.fingerprint(), canonical_scenarios(scenarios),
+                    astuple(params), extra))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SolveCache:
+    def __init__(self, maxsize=256, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._store = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self._store)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key):
+        """ 找不到時回傳 None (求解失敗的結果不會被快取) """
+        if key in self._store:
+            self._store.move_to_end(key)
+            self.hits += 1
+            return self._store[key]
+        if self.path and os.path.exists(self._file(key)):
+            with open(self._file(key), 'rb') as fh:
+                value = pickle.load(fh)
+            self._remember(key, value)
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """ 求解失敗的結果 (None，或 EEV 的 9999999.0，例如時間上限、授權) 不寫入快取，下次重新求解 """
+        if value is None or (isinstance(value, float) and value >= 9999999.0): return
+        self._remember(key, value)
+        if self.path:
+            # 先寫入暫存檔再改名，避免平行寫入時讀到不完整的檔案
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(value, fh)
+            os.replace(tmp, self._file(key))
+
+    def _remember(self, key, value):
+        self._store[key] = value
+        self._store.move_to_end(key)
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    # ------------------------------------------
+    # 與 planning 相同介面的快取版本
+    # ------------------------------------------
+    def solve_robust_model(self, case_name, current_scenarios, net=None, params=DEFAULT_PARAMS, solver=None):
+        """ solver: 快取未命中時使用的求解器 (例如 planning.RobustModel)，省略時重新建模求解 """
+        if net is None: net = ieee13_network()
+        key = solve_key("RP", current_scenarios, net, params)
+        res = self.get(key)
+        if res is None:
+            solve = solver.solve_robust_model if solver is not None else solve_robust_model
+            res = solve(case_name, current_scenarios, net, params)
+            if res is None: return None
+            self.put(key, res)
+        return relabel_result(res, case_name, current_scenarios)
+
+    def evaluate_fixed_plan(self, fixed_hardened, fixed_dgs, scenarios, net=None, params=DEFAULT_PARAMS, evaluator=None):
+        if net is None: net = ieee13_network()
+        key = solve_key("EEV", scenarios, net, params, (tuple(sorted(fixed_hardened)), tuple(sorted(fixed_dgs))))
+        res = self.get(key)
+        if res is None:
+            res = evaluate_fixed_plan(fixed_hardened, fixed_dgs, scenarios, net, params, evaluator)
+            self.put(key, res)
+        return res
+
+
+def relabel_result(res, case_name, current_scenarios):
+    """ 快取結果與情境名稱無關，取用時換回目前的案例名稱與 S1/S2 機率 """
+    res = dict(res)
+    res["Case Name"] = case_name
+    res["S1 Prob"] = current_scenarios['S1']['prob'] if 'S1' in current_scenarios else 1.0
+    res["S2 Prob"] = current_scenarios['S2']['prob'] if 'S2' in current_scenarios else 0.0
+    return res
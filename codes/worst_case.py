@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+最壞情況攻擊 (Defender-Attacker-Defender, Column-and-Constraint Generation)
+
+solve_robust_model 只對 test_cases 中列出的攻擊集合取期望值。這裡給定攻擊預算 K (最多同時破壞 K 條線路)，求
+    min_x [ 投資(x) + max_{|a| <= K} Q(x, a) ]
+  * Master: 第一階段 y_h, y_g 與 eta；已找到的每個攻擊 a_j 各一組 LinDistFlow 區塊與 eta >= Q_j，最佳值為下界
+  * Attacker: 固定目前的方案 x^，找 Q(x^, a) 最大的攻擊 (只攻擊未強化的線路)；投資(x^) + Q(x^, a*) 為上界
+新的攻擊加入 Master (新增變數與限制式，即 column-and-constraint) 後重新求解，直到上下界收斂或攻擊已在 Master 中
+
+第二階段有開關二元變數，Attacker 無法以對偶改寫成單一 MILP，因此以 RadialRecourse 批次評估攻擊集合:
+  * K 條線路的組合數不超過 enum_limit 時全部列舉 (精確)。Q 對攻擊集合單調，只需列舉恰好 K 條的組合
+  * 否則從空集合與 Master 中已有的攻擊出發，逐條貪婪補足 K 條、再以交換一條線路的鄰域爬升
+    (每一步的所有鄰居一次批次評估)。找到的攻擊不比 Master 中的差，上界不低於下界，但只是估計 ("Exact Attacker" 為 False)
+
+用法: python worst_case.py --k 2 [--max-iter 20] [--verbose]
+"""
+import itertools
+import time
+from math import comb
+
+from gurobipy import GRB
+import numpy as np
+
+from distflow import ieee13_network, add_distflow_block
+import instrumentation
+from planning import DEFAULT_PARAMS, canonical_attack, new_model, scenario_cost
+from radial_recourse import RadialRecourse
+
+# ==========================================
+# 1. Attacker 子問題
+# ==========================================
+def worst_attack(hardened, dgs, K, net=None, params=DEFAULT_PARAMS, evaluator=None, enum_limit=20000,
+                 seeds=(), batch=4096, tol=1e-6):
+    """
+    固定方案 (hardened, dgs) 下第二階段成本最大的 K 條線路攻擊，回傳 (攻擊線路, Q, 是否精確)
+    seeds: 局部搜尋的起點 (例如 Master 中已有的攻擊)；已強化的線路先移除，不足 K 條時貪婪補足
+    """
+    if net is None: net = ieee13_network()
+    if evaluator is None: evaluator = RadialRecourse(net, params)
+    hardened = set(hardened)
+    cand = [k for k, l in enumerate(net.line_ids) if l not in hardened]
+    K = min(K, len(cand))
+
+    def costs(sets):
+        attacked = np.zeros((len(sets), net.n_lines), dtype=bool)
+        for i, pos in enumerate(sets):
+            attacked[i, list(pos)] = True
+        return evaluator.scenario_costs(hardened, dgs, attacked)
+
+    def best_of(options):
+        q = costs(options)
+        i = int(np.argmax(q))
+        return options[i], float(q[i])
+
+    if comb(len(cand), K) <= enum_limit:
+        best, best_q = (), -np.inf
+        combos = itertools.combinations(cand, K)
+        while True:
+            chunk = list(itertools.islice(combos, batch))
+            if not chunk:
+                break
+            top, q = best_of(chunk)
+            if q > best_q:
+                best, best_q = top, q
+        return [net.line_ids[k] for k in sorted(best)], best_q, True
+
+    def climb(start):
+        """ 貪婪補足 K 條，再以交換一條線路的鄰域爬升 """
+        current = tuple(start)
+        q = float(costs([current])[0])
+        while len(current) < K:
+            current, q = best_of([current + (k,) for k in cand if k not in current])
+        while True:
+            option, q_new = best_of([tuple(j if k == out else k for k in current)
+                                     for out in current for j in cand if j not in current])
+            if q_new <= q + tol:
+                return current, q
+            current, q = option, q_new
+
+    alive = set(cand)
+    starts = {()} | {tuple(k for k in net.line_positions(seed) if k in alive)[:K] for seed in seeds}
+    best, best_q = max((climb(start) for start in starts), key=lambda r: r[1])
+    return [net.line_ids[k] for k in sorted(best)], best_q, False
+
+# ==========================================
+# 2. Master 問題
+# ==========================================
+class WorstCaseMaster:
+    """
+    min 投資 + eta，eta >= 每個已加入攻擊的第二階段成本；add_attack() 在同一個模型中新增一組區塊
+    成本與 RobustModel 相同以 Obj 係數表示 (eta 的係數為 1)；solve() 以上一輪的方案暖啟動
+    """
+
+    def __init__(self, net=None, params=DEFAULT_PARAMS, case_name="Worst_Case"):
+        t0 = time.perf_counter()
+        if net is None: net = ieee13_network()
+        self.net = net
+        self.params = params
+        self.attacks = []
+        self.blocks = []
+        self.dg_cap_pu = params.dg_cap_pu(net)
+
+        model = new_model(f"CCG_{case_name}")
+        self.model = model
+        self.y_h = model.addMVar(net.n_lines, vtype=GRB.BINARY, name="y_h")
+        self.y_g = model.addMVar(len(net.candidate_nodes), vtype=GRB.BINARY, name="y_g")
+        self.eta = model.addMVar(1, lb=0.0, name="eta")
+        model.addConstr(self.y_h.sum() <= params.Budget_H, name="Budget_H")
+        model.addConstr(self.y_g.sum() <= params.Budget_G, name="Budget_G")
+        self.y_h.Obj = params.Cost_Hard_Line
+        self.y_g.Obj = params.Cost_DG_kW * params.DG_Cap_kW
+        self.eta.Obj = 1.0
+        model.ModelSense = GRB.MINIMIZE
+        self._start = None
+        self.build_s = time.perf_counter() - t0  # 尚未計入求解紀錄的建模時間
+
+    def add_attack(self, attack):
+        """ 加入一個攻擊集合 (已存在時略過)，回傳是否新增 """
+        t0 = time.perf_counter()
+        key = canonical_attack(attack)
+        if key in self.attacks:
+            return False
+        net, params, model = self.net, self.params, self.model
+        k = len(self.attacks)
+        blk = add_distflow_block(model, net, f"a{k}", gen_nodes=net.candidate_nodes, gen_cap_pu=self.dg_cap_pu,
+                                 radiality=params.Radiality, max_gens=params.Budget_G)
+        att = net.line_positions(key)
+        if len(att):
+            model.addConstr(blk.v[att] <= self.y_h[att], name=f"Survive_a{k}")
+        model.addConstr(blk.P_gen <= self.dg_cap_pu * self.y_g, name=f"DG_Logic_a{k}")
+        model.addConstr(self.eta >= scenario_cost(net, params, blk), name=f"Worst_a{k}")
+        self.attacks.append(key)
+        self.blocks.append(blk)
+        self.build_s += time.perf_counter() - t0
+        return True
+
+    def solve(self):
+        """ 回傳 (下界, hardened, new_dgs)；求解失敗時為 None """
+        if self._start is not None:
+            self.y_h.Start, self.y_g.Start = self._start
+        instrumentation.solve(self.model, "C&CG", self.build_s)
+        self.build_s = 0.0
+        if self.model.status != GRB.OPTIMAL:
+            return None
+        y_h, y_g = np.round(self.y_h.X), np.round(self.y_g.X)
+        self._start = (y_h, y_g)
+        net = self.net
+        hardened = [net.line_ids[k] for k in np.flatnonzero(y_h > 0.5)]
+        new_dgs = [net.candidate_nodes[k] for k in np.flatnonzero(y_g > 0.5)]
+        return self.model.ObjVal, hardened, new_dgs
+
+# ==========================================
+# 3. C&CG 主迴圈
+# ==========================================
+def solve_worst_case(case_name, K, net=None, params=DEFAULT_PARAMS, initial_attacks=(), max_iter=20, tol=1e-4,
+                     enum_limit=20000, verbose=False):
+    """
+    攻擊預算 K 下的最壞情況規劃，回傳 dict:
+      Hardened / New DGs / Obj Value (最壞情況總成本，上界) / Invest ($) / Worst Attack / Worst-Case Q
+      Iterations / Lower Bound / Gap / Attacks (Master 中的攻擊集合) / Exact Attacker
+    initial_attacks: 先放進 Master 的攻擊集合 (例如 test_cases 中的情境)，可減少迭代次數
+    """
+    if net is None: net = ieee13_network()
+    master = WorstCaseMaster(net, params, case_name)
+    for attack in initial_attacks:
+        master.add_attack(attack)
+    evaluator = RadialRecourse(net, params)
+
+    # 每一輪的 (總成本, 方案, 攻擊, Q)。局部搜尋低估的總成本會低於之後的下界 (任何方案的最壞成本都不低於下界)，
+    # 這些估計在選擇最佳方案時略過
+    history, lb, it, exact = [], -np.inf, 0, True
+    for it in range(1, max_iter + 1):
+        solved = master.solve()
+        if solved is None:
+            return None
+        lb, hardened, new_dgs = solved
+        attack, q, exact_it = worst_attack(hardened, new_dgs, K, net, params, evaluator, enum_limit, master.attacks)
+        exact &= exact_it
+        history.append((params.invest_cost(len(hardened), len(new_dgs)) + q, hardened, new_dgs, attack, q))
+        best_ub, *best = min((h for h in history if h[0] >= lb - tol * max(1.0, abs(lb))),
+                          key=lambda h: h[0], default=history[-1])
+        if verbose:
+            print(f"Iter {it:<3} | LB = {lb:,.2f} | UB = {best_ub:,.2f} | plan = {hardened} {new_dgs} | attack = {attack}")
+        if best_ub - lb <= tol * max(1.0, abs(best_ub)):
+            break
+        if not master.add_attack(attack):
+            break  # 攻擊已在 Master 中: 上下界只差求解精度
+
+    hardened, new_dgs, attack, q = best
+    return {
+        "Case Name": case_name, "K": K,
+        "Hardened": hardened, "New DGs": new_dgs,
+        "Obj Value": round(best_ub, 2),
+        "Invest ($)": round(params.invest_cost(len(hardened), len(new_dgs)), 2),
+        "Worst Attack": attack, "Worst-Case Q": round(q, 2),
+        "Iterations": it, "Lower Bound": round(lb, 2),
+        "Gap": round(max(0.0, best_ub - lb) / max(1.0, abs(best_ub)), 6),
+        "Attacks": [list(a) for a in master.attacks], "Exact Attacker": exact,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worst-case attack planning by column-and-constraint generation")
+    parser.add_argument("--k", type=int, default=2, help="attack budget (number of lines destroyed)")
+    parser.add_argument("--max-iter", type=int, default=20)
+    parser.add_argument("--enum-limit", type=int, default=20000,
+                        help="enumerate every K-line attack up to this many combinations, otherwise local search")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    result = solve_worst_case(f"K{args.k}", args.k, max_iter=args.max_iter, enum_limit=args.enum_limit,
+                              verbose=args.verbose)
+    for key, value in (result or {}).items():
+        print(f"{key:<15}: {value}")